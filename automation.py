@@ -61,6 +61,7 @@ FALLBACK_ML_INITIAL_TRUST_SCORE = 75.0
 FALLBACK_DEVICE_RELIABILITY_RANGE_AUTO = (60.0, 90.0)
 FALLBACK_PREDICTED_NOISE_PROB_RANGE_AUTO = (0.05, 0.30)
 FALLBACK_DATA_CONSISTENCY_BASELINE_AUTO = (0.6, 0.95)
+SENSOR_RANDOM_DRAWS_AFTER_FEATURES = 6 # ML-side and profile reliability/noise fallbacks, data consistency, GT noise roll
 
 
 DEPLOYABLE_DEVICE_CONFIGS = [
@@ -89,6 +90,11 @@ command_snippet_files = []
 run_sensor_data_for_log = []
 
 
+def draw_sensor_static_features():
+    """(manufacturer, software version, device age) for one sensor, drawn in the sensor loop's order."""
+    return random.choice(list(MANUFACTURER_PROFILES.keys())), random.choice(list(SOFTWARE_PROFILES.keys())), round(random.uniform(MIN_DEVICE_AGE_YEARS, MAX_DEVICE_AGE_YEARS), 2)
+
+
 def generate_graph(num_nodes, density_factor, seed_val_str):
     if seed_val_str == "random": seed_val = random.randint(1, 100000)
     else:
@@ -155,6 +161,24 @@ def generate_lab_config(G, placed_traffic_light_nodes_param, sensor_cluster_defi
         sensor_config_details = device_configs_map.get(sensor_type_defined, {})
         sensor_image_name = sensor_config_details.get("image", "default_sensor_image")
 
+        # One batched ML call per cluster without changing what a seed generates: a dry run draws each sensor's features
+        # and its later draws, then the stream is rewound so the sensor loop draws them again in the original order.
+        # A sensor whose redrawn features weren't batched (the batch call failed) is predicted on its own.
+        cluster_ml_predictions = {}
+        if ML_ASSESSOR_AVAILABLE and ML_MODELS_PRESENT and num_sensors_for_this_cluster > 0:
+            rng_state = random.getstate(); planned_sensor_features = []
+            for _ in range(num_sensors_for_this_cluster):
+                planned_sensor_features.append(draw_sensor_static_features())
+                for _ in range(SENSOR_RANDOM_DRAWS_AFTER_FEATURES): random.random()
+            random.setstate(rng_state)
+            try:
+                cluster_ml_predictions = dict(zip(planned_sensor_features, ml_risk_assessor.predict_initial_attributes_batch([
+                    {"manufacturer": mfg, "software_version": sw, "is_signed": 1 if SOFTWARE_PROFILES[sw]["is_signed"] else 0,
+                     "software_age_years": SOFTWARE_PROFILES[sw]["release_date_offset_years"], "device_age_years": age}
+                    for mfg, sw, age in planned_sensor_features])))
+            except Exception as e:
+                print(f"  WARNING: Batched ML prediction for cluster {cluster_id_str} failed: {e}. Predicting per sensor.")
+
         for sensor_index_in_cluster in range(1, num_sensors_for_this_cluster + 1):
             sensor_base_name = sensor_config_details.get("type", sensor_type_defined)
             sensor_kathara_name = f"cluster{cluster_id_str}_{sensor_base_name}{sensor_index_in_cluster}"
@@ -167,12 +191,10 @@ def generate_lab_config(G, placed_traffic_light_nodes_param, sensor_cluster_defi
                 f"{sensor_kathara_name}[0]={current_cluster_lan}    $ip({sensor_ip_on_lan}/24); to(default, {router_ip_on_lan});"
             ])
 
-            mfg_name = random.choice(list(MANUFACTURER_PROFILES.keys()))
-            sw_version_key = random.choice(list(SOFTWARE_PROFILES.keys()))
+            mfg_name, sw_version_key, dev_age_val = draw_sensor_static_features()
             sw_version_profile = SOFTWARE_PROFILES[sw_version_key]
             is_sw_signed = sw_version_profile["is_signed"]
             sw_age_val = sw_version_profile["release_date_offset_years"]
-            dev_age_val = round(random.uniform(MIN_DEVICE_AGE_YEARS, MAX_DEVICE_AGE_YEARS), 2)
             
             static_features_for_ml = {
                 "manufacturer": mfg_name, "software_version": sw_version_key,
@@ -183,7 +205,9 @@ def generate_lab_config(G, placed_traffic_light_nodes_param, sensor_cluster_defi
             ml_predictions = None
             if ML_ASSESSOR_AVAILABLE and ML_MODELS_PRESENT:
                 try:
-                    ml_predictions = ml_risk_assessor.predict_initial_attributes(static_features_for_ml)
+                    model_predictions = cluster_ml_predictions.get((mfg_name, sw_version_key, dev_age_val))
+                    if model_predictions is None: ml_predictions = ml_risk_assessor.predict_initial_attributes(static_features_for_ml)
+                    else: ml_predictions = ml_risk_assessor.predictions_with_fallbacks(*model_predictions) # Fallbacks drawn here, in per-sensor order
                 except Exception as e:
                     print(f"  WARNING: ML prediction (InitialTrust) for {globally_unique_sensor_id} failed: {e}. Fallbacks used.")
                     ml_predictions = None
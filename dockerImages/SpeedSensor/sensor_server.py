@@ -5,6 +5,7 @@ import json
 import os
 import threading
 import socket
+import struct
 import random
 
 # --- Configuration ---
@@ -18,11 +19,17 @@ QUERY_INTERVAL_SECONDS = 5.0
 REQUEST_TIMEOUT_SECONDS = 3.0
 LISTEN_PORT = 5001
 LISTEN_HOST = '0.0.0.0'
+FRAME_REQUEST = b"G" # Binary request from traffic lights; answered with a fixed 5-byte frame
+FRAME = struct.Struct('>Bi') # status byte (bit0 = valid, bit1 = priority) + big-endian int32 traffic
+FRAME_FLAG_VALID = 0x01
+FRAME_FLAG_PRIORITY = 0x02
+FRAME_CONNECTION_IDLE_TIMEOUT_SECONDS = 60.0 # Binary-protocol lights keep their connection open between cycles; drop it if they go quiet
 CENTRAL_SERVER_PORT = 5000 # Port the central server listens on
 DEFAULT_NOISE_MAGNITUDE = 5
 CONFIG_WAIT_TIMEOUT_SECONDS = 35
 CONFIG_CHECK_INTERVAL_SECONDS = 0.5
 SOCKET_BIND_RETRY_DELAY = 1.0
+TCP_FASTOPEN_QUEUE_LEN = 16 # Pending TFO requests; the kernel still needs net.ipv4.tcp_fastopen server bit (2) to honour it
 SOCKET_BIND_MAX_ATTEMPTS = 10
 INITIAL_SERVER_QUERY_DELAY_SECONDS = 5
 
@@ -211,48 +218,56 @@ def query_central_server_loop():
 
 
 def handle_light_connection(conn, addr):
-    # Safely get current state for this connection handler
-    with state_lock:
-        sensor_id_for_log = my_cluster_id if my_cluster_id is not None else "UNKNOWN_ID"
-        query_was_successful = last_query_success
-        traffic_from_central = current_ground_truth_traffic
-        actual_priority_from_central = current_priority_on_edge # NEW: Get actual priority
-        act_noisy_traffic_this_time = is_configured_noisy_this_run # For traffic count noise
-    
+    sensor_id_for_log = "UNKNOWN_ID"
     try:
-        conn.settimeout(5.0) # Timeout for this specific connection
-        request = conn.recv(1024).decode('utf-8').strip()
-
-        if request == "GET_TRAFFIC":
-            traffic_to_report = -1 
-            priority_to_report = False # Default priority to report
-
-            if query_was_successful:
-                traffic_to_report = traffic_from_central
-                if act_noisy_traffic_this_time: # Apply noise to traffic count if sensor is noisy
-                    noise = random.randint(-DEFAULT_NOISE_MAGNITUDE, DEFAULT_NOISE_MAGNITUDE)
-                    traffic_to_report = max(0, traffic_to_report + noise)
-                
-                # Determine priority to report
-                priority_to_report = actual_priority_from_central # Start with actual priority
-                
-                # NEW: Noisy sensor false priority reporting logic
-                if act_noisy_traffic_this_time and not actual_priority_from_central: # If sensor is noisy AND no actual priority
-                    if random.random() < NOISY_SENSOR_FALSE_PRIORITY_CHANCE:
-                        priority_to_report = True # Falsely report priority
-                        # print(f"Sensor {sensor_id_for_log}: Noisy sensor Falsely reporting PRIORITY=true (Actual was false)") # Optional: for debugging
+        conn.settimeout(5.0) # Timeout for the first request on this connection
+        while True: # Binary frame requests are answered on the same connection until the light closes it; text requests are one-shot
+            request_bytes = conn.recv(1024)
+            if not request_bytes: break # Light closed the connection
+            # Safely get current state for this request
+            with state_lock:
+                sensor_id_for_log = my_cluster_id if my_cluster_id is not None else "UNKNOWN_ID"
+                query_was_successful = last_query_success
+                traffic_from_central = current_ground_truth_traffic
+                actual_priority_from_central = current_priority_on_edge # NEW: Get actual priority
+                act_noisy_traffic_this_time = is_configured_noisy_this_run # For traffic count noise
+            is_frame_request = request_bytes == FRAME_REQUEST
+            request = request_bytes.decode('utf-8', errors='replace').strip()
+
+            if is_frame_request or request == "GET_TRAFFIC":
+                traffic_to_report = -1 
+                priority_to_report = False # Default priority to report
+
+                if query_was_successful:
+                    traffic_to_report = traffic_from_central
+                    if act_noisy_traffic_this_time: # Apply noise to traffic count if sensor is noisy
+                        noise = random.randint(-DEFAULT_NOISE_MAGNITUDE, DEFAULT_NOISE_MAGNITUDE)
+                        traffic_to_report = max(0, traffic_to_report + noise)
+                    
+                    # Determine priority to report
+                    priority_to_report = actual_priority_from_central # Start with actual priority
+                    
+                    # NEW: Noisy sensor false priority reporting logic
+                    if act_noisy_traffic_this_time and not actual_priority_from_central: # If sensor is noisy AND no actual priority
+                        if random.random() < NOISY_SENSOR_FALSE_PRIORITY_CHANCE:
+                            priority_to_report = True # Falsely report priority
+                            # print(f"Sensor {sensor_id_for_log}: Noisy sensor Falsely reporting PRIORITY=true (Actual was false)") # Optional: for debugging
+                else:
+                    # If query to central server failed, report error traffic and no priority
+                    print(f"Sensor {sensor_id_for_log}: Last central query failed. Reporting error value (-1) and PRIORITY=false to {addr}.")
+                    traffic_to_report = -1
+                    priority_to_report = False # Ensure priority is false on query failure
+
+                if is_frame_request: # Fixed-size binary frame; the -1 error value still travels as a valid reading
+                    conn.sendall(FRAME.pack(FRAME_FLAG_VALID | (FRAME_FLAG_PRIORITY if priority_to_report else 0), traffic_to_report))
+                    conn.settimeout(FRAME_CONNECTION_IDLE_TIMEOUT_SECONDS); continue # Wait for the light's next cycle
+                # Format response string with both traffic and priority (text protocol kept for older controllers)
+                response_str = f"TRAFFIC={traffic_to_report};PRIORITY={str(priority_to_report).lower()}\n"
+                conn.sendall(response_str.encode('utf-8'))
             else:
-                # If query to central server failed, report error traffic and no priority
-                print(f"Sensor {sensor_id_for_log}: Last central query failed. Reporting error value (-1) and PRIORITY=false to {addr}.")
-                traffic_to_report = -1
-                priority_to_report = False # Ensure priority is false on query failure
-
-            # Format response string with both traffic and priority
-            response_str = f"TRAFFIC={traffic_to_report};PRIORITY={str(priority_to_report).lower()}\n"
-            conn.sendall(response_str.encode('utf-8'))
-        else:
-            print(f"Sensor {sensor_id_for_log}: Unknown request from {addr}: {request}")
-            conn.sendall(b"ERROR=UnknownRequest\n") # Keep simple error for unknown
+                print(f"Sensor {sensor_id_for_log}: Unknown request from {addr}: {request}")
+                conn.sendall(b"ERROR=UnknownRequest\n") # Keep simple error for unknown
+            break
 
     except socket.timeout: print(f"Sensor {sensor_id_for_log}: Socket timeout with {addr}")
     except Exception as e: print(f"Sensor {sensor_id_for_log}: Error handling connection from {addr}: {e}")
@@ -270,6 +285,9 @@ def start_socket_server():
         try:
             server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, "TCP_FASTOPEN"): # Lets lights send the request in the SYN; falls back to a normal handshake otherwise
+                try: server_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_FASTOPEN, TCP_FASTOPEN_QUEUE_LEN)
+                except OSError as e: print(f"Sensor Info (Cluster {log_cid_socket}): TCP Fast Open unavailable: {e}")
             server_socket.bind((LISTEN_HOST, LISTEN_PORT))
             bind_success = True
             print(f"Sensor (Cluster {log_cid_socket}): Socket bound successfully on attempt {attempt + 1}.")
@@ -1,27 +1,64 @@
 #!/usr/bin/env python3
 import time
-import requests
+import urllib3
 import json
 import os
 import random
+import re
 import socket
+import selectors
+import errno
+import struct
 import threading
+import concurrent.futures
+import functools
 import numpy as np
 import skfuzzy as fuzz
 from skfuzzy import control as ctrl
 import signal # For graceful shutdown
+import sys
+import logging
+import logging.handlers
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+    INOTIFY_AVAILABLE = True
+except ImportError:
+    INOTIFY_AVAILABLE = False
+try:
+    from numba import njit # JIT for the fuzzy evaluator; the NumPy version is used without it
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+try:
+    import orjson # Faster parsing for the sensor map and central server responses, and the report write
+    json_loads = orjson.loads
+    def json_dumps_report(obj): return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    json_loads = json.loads
+    def json_dumps_report(obj): return json.dumps(obj, indent=2).encode('utf-8')
 
 # --- Configuration ---
 TRAFFIC_SERVER_IP_FILE = "/etc/traffic_server_ip"
 NODE_ID_FILE = "/etc/node_id"
 LIGHT_SENSOR_MAP_FILE = "/shared/light_sensor_map.json"
 EVALUATION_INTERVAL_SECONDS = 5.0
+SENSOR_MAP_RECHECK_CYCLES = 6 # stat() the shared sensor map every N cycles; it is only re-read when its mtime changed
 SENSOR_QUERY_TIMEOUT_SECONDS = 2.0
 CENTRAL_QUERY_TIMEOUT_SECONDS = 3.0
 SENSOR_LISTEN_PORT = 5001
+SENSOR_FRAME_REQUEST = b"G" # Binary request; sensor answers with a fixed 5-byte frame
+SENSOR_FRAME = struct.Struct('>Bi') # status byte (bit0 = valid, bit1 = priority) + big-endian int32 traffic
+SENSOR_FRAME_FLAG_VALID = 0x01
+SENSOR_FRAME_FLAG_PRIORITY = 0x02
+SENSOR_TEXT_RESPONSE_RE = re.compile(rb'TRAFFIC=([+-]?\d+)(?:.*?PRIORITY=(\w+))?', re.S) # Legacy text reply; PRIORITY is optional and defaults to false
+SENSOR_SOCKET_BUFFER_BYTES = 4096 # Request/response are a few bytes; keep kernel buffers small
+SENSOR_SOCKET_LINGER = struct.pack('ii', 1, 1) # SO_LINGER on, 1 s: bounded graceful close after a drain
+USE_TCP_FASTOPEN = hasattr(socket, "MSG_FASTOPEN") # Connect + request in one sendto once the kernel has a TFO cookie for the sensor
+TCP_FASTOPEN_CONNECT = getattr(socket, "TCP_FASTOPEN_CONNECT", 30) # Linux >= 4.11; lets a non-blocking connect()+send() use TFO
 CONFIG_WAIT_TIMEOUT_SECONDS = 35
 CONFIG_CHECK_INTERVAL_SECONDS = 0.5
 CENTRAL_SERVER_PORT = 5000
+IO_POOL_WORKERS = 4 # Blocking I/O (central server HTTP, legacy text sensors) overlapped with the selector fan-out
 INITIAL_SERVER_QUERY_DELAY_SECONDS = 7
 
 # NEW: Performance Reporting Config
@@ -30,6 +67,25 @@ SIMULATION_END_SIGNAL_FILE = "/shared/SIMULATION_ENDING_PLEASE_REPORT"
 SKIP_INITIAL_CYCLES_FOR_EVAL = 10 
 MAX_EVAL_CYCLES_FOR_REPORT = 30  
 
+# Logging: records are buffered and written in one go (warnings flush immediately)
+LOG_BUFFER_CAPACITY = 64
+class CycleLogBuffer(logging.handlers.MemoryHandler): # Flushes the buffered records as one joined write to the target stream (StreamHandler would write+flush per record)
+    def flush(self):
+        with self.lock:
+            if not self.buffer: return
+            self.target.write("".join(self.format(record) + "\n" for record in self.buffer)); self.target.flush(); self.buffer.clear()
+
+log = logging.getLogger("tl")
+log_buffer_handler = CycleLogBuffer(capacity=LOG_BUFFER_CAPACITY, flushLevel=logging.WARNING, target=sys.stdout)
+log.addHandler(log_buffer_handler); log.setLevel(logging.INFO); log.propagate = False
+cached_timestamp_second = None; cached_timestamp_str = "" # strftime result reused within the same wall-clock second
+
+def cycle_timestamp():
+    global cached_timestamp_second, cached_timestamp_str
+    now_second = int(time.time())
+    if now_second != cached_timestamp_second: cached_timestamp_second = now_second; cached_timestamp_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now_second))
+    return cached_timestamp_str
+
 # Trust & Attribute Configuration & Fuzzy Logic Setup
 FALLBACK_ML_INITIAL_TRUST_SCORE = 75.0
 TRUST_UPDATE_ALPHA = 0.3
@@ -48,10 +104,15 @@ FALLBACK_PREDICTED_NOISE_PROP_MAP = 0.15
 FALLBACK_DATA_CONSISTENCY_MAP = 0.80
 
 # Fuzzy Logic (remains same as traffic_light_controller_no_gt_trust_v3_logging)
-device_reliability_universe = np.arange(0, 101, 1); data_consistency_universe = np.arange(0, 1.01, 0.01)
-predicted_noise_prop_universe = np.arange(0, 1.01, 0.01); peer_agreement_zscore_universe = np.arange(-3.5, 3.51, 0.1)
-passage_deviation_universe = np.arange(0, 31, 1); DEFAULT_PASSAGE_DEVIATION_INPUT = 10.0
+# Inputs whose terms are all trimf only need the terms' key points (interpolating a triangle between its corners is exact).
+# The z-score universe stays dense for the curved zmf/smf terms, and the output universe stays dense for the centroid.
+device_reliability_universe = np.array([0, 25, 40, 50, 60, 70, 80, 85, 100], dtype=np.float64); data_consistency_universe = np.array([0, 0.25, 0.4, 0.5, 0.6, 0.7, 0.8, 0.85, 1.0])
+predicted_noise_prop_universe = np.array([0, 0.15, 0.2, 0.3, 0.4, 0.5, 0.6, 0.75, 1.0]); peer_agreement_zscore_universe = np.arange(-3.5, 3.51, 0.1)
+passage_deviation_universe = np.array([0, 3, 5, 7, 10, 12, 15, 20, 30], dtype=np.float64); DEFAULT_PASSAGE_DEVIATION_INPUT = 10.0
 trust_update_output_universe = np.arange(0, 101, 1)
+PEER_Z_MIN = float(peer_agreement_zscore_universe[0]); PEER_Z_MAX = float(peer_agreement_zscore_universe[-1]); PASSAGE_DEVIATION_MAX = float(passage_deviation_universe[-1]) # Input clip bounds used per cycle
+SENSOR_ARRAY_DTYPE = np.float32 # Per-sensor attribute, fuzzy input and trust arrays; trust only needs ~0.01 precision over 10..100
+USE_GAUSSIAN_MFS = False # Comparison runs only: Gaussian input terms in the NumPy evaluator. Production keeps the piecewise-linear terms (no exp per term)
 device_reliability_ant = ctrl.Antecedent(device_reliability_universe, 'device_reliability')
 data_consistency_ant = ctrl.Antecedent(data_consistency_universe, 'data_consistency')
 predicted_noise_prop_ant = ctrl.Antecedent(predicted_noise_prop_universe, 'predicted_noise_prop')
@@ -65,26 +126,167 @@ peer_agreement_zscore_ant['better_than_peers'] = fuzz.zmf(peer_agreement_zscore_
 passage_deviation_ant['low'] = fuzz.trimf(passage_deviation_ant.universe, [0, 3, 7]); passage_deviation_ant['medium'] = fuzz.trimf(passage_deviation_ant.universe, [5, 10, 15]); passage_deviation_ant['high'] = fuzz.trimf(passage_deviation_ant.universe, [12, 20, 30])
 trust_update_cons['very_low'] = fuzz.trimf(trust_update_cons.universe, [0, 10, 25]); trust_update_cons['low'] = fuzz.trimf(trust_update_cons.universe, [20, 35, 50]); trust_update_cons['medium'] = fuzz.trimf(trust_update_cons.universe, [40, 60, 80]); trust_update_cons['high'] = fuzz.trimf(trust_update_cons.universe, [70, 85, 100])
 rule_passage_confirmed_good_reliability = ctrl.Rule(passage_deviation_ant['low'] & device_reliability_ant['high'], trust_update_cons['high']); rule_passage_unconfirmed_severe = ctrl.Rule(passage_deviation_ant['high'], trust_update_cons['very_low']); rule_good_peer_agreement_good_reliability = ctrl.Rule(peer_agreement_zscore_ant['similar_to_peers'] & device_reliability_ant['high'], trust_update_cons['high']); rule_better_peer_agreement = ctrl.Rule(peer_agreement_zscore_ant['better_than_peers'] & device_reliability_ant['medium'], trust_update_cons['high']); rule_bad_peer_agreement = ctrl.Rule(peer_agreement_zscore_ant['worse_than_peers'], trust_update_cons['very_low']); rule_low_static_reliability = ctrl.Rule(device_reliability_ant['low'], trust_update_cons['low']); rule_noisy_and_somewhat_worse_peers = ctrl.Rule(predicted_noise_prop_ant['high'] & peer_agreement_zscore_ant['worse_than_peers'], trust_update_cons['low']); rule_poor_static_consistency = ctrl.Rule(data_consistency_ant['poor'], trust_update_cons['low']); rule_passage_medium_dev = ctrl.Rule(passage_deviation_ant['medium'], trust_update_cons['medium']); rule_neutral_inputs_maintain_medium = ctrl.Rule(peer_agreement_zscore_ant['similar_to_peers'] & passage_deviation_ant['medium'] & device_reliability_ant['medium'], trust_update_cons['medium']); rule_neutral_inputs_low_reliability = ctrl.Rule(peer_agreement_zscore_ant['similar_to_peers'] & passage_deviation_ant['medium'] & device_reliability_ant['low'], trust_update_cons['low'])
-trust_simulation_instance = None
+trust_ctrl_system = None # skfuzzy reference system; simulations are built per fallback batch, never kept across cycles
+rules_to_use = [rule_passage_confirmed_good_reliability, rule_passage_unconfirmed_severe, rule_good_peer_agreement_good_reliability, rule_better_peer_agreement, rule_bad_peer_agreement, rule_low_static_reliability, rule_noisy_and_somewhat_worse_peers, rule_poor_static_consistency, rule_passage_medium_dev, rule_neutral_inputs_maintain_medium, rule_neutral_inputs_low_reliability]
 try:
-    rules_to_use = [rule_passage_confirmed_good_reliability, rule_passage_unconfirmed_severe, rule_good_peer_agreement_good_reliability, rule_better_peer_agreement, rule_bad_peer_agreement, rule_low_static_reliability, rule_noisy_and_somewhat_worse_peers, rule_poor_static_consistency, rule_passage_medium_dev, rule_neutral_inputs_maintain_medium, rule_neutral_inputs_low_reliability]; trust_ctrl_system = ctrl.ControlSystem(rules_to_use); trust_simulation_instance = ctrl.ControlSystemSimulation(trust_ctrl_system); print("TL Info: Fuzzy control system initialized.")
+    trust_ctrl_system = ctrl.ControlSystem(rules_to_use); print("TL Info: Fuzzy control system initialized.")
 except Exception as e: print(f"TL FATAL: Failed to initialize fuzzy control system: {e}")
 
+# Vectorized evaluator for the rule base above: all sensors in one NumPy pass instead of one ControlSystemSimulation.compute() each.
+# Matches skfuzzy: inputs clipped to the universes, zmf/smf read off their sampled curves, AND = fmin, accumulation = fmax,
+# min-implication, and the centroid over the output universe upsampled with each term's cut points.
+FUZZY_EPS = np.finfo(float).eps
+TRUST_OUT_UNIVERSE = trust_update_output_universe.astype(np.float64)
+TRUST_OUT_A = np.array([0.0, 20.0, 40.0, 70.0]); TRUST_OUT_B = np.array([10.0, 35.0, 60.0, 85.0]); TRUST_OUT_C = np.array([25.0, 50.0, 80.0, 100.0]) # very_low, low, medium, high
+
+def fuzzy_trimf(x, a, b, c): return np.maximum(0.0, np.minimum((x - a) / (b - a), (c - x) / (c - b)))
+
+def fuzzy_zmf(x, a, b): 
+    t = (x - a) / (b - a)
+    return np.where(x <= a, 1.0, np.where(x >= b, 0.0, np.where(x <= (a + b) / 2.0, 1.0 - 2.0 * t * t, 2.0 * (1.0 - t) ** 2)))
+
+def fuzzy_smf(x, a, b): return 1.0 - fuzzy_zmf(x, a, b)
+
+def fuzzy_gaussmf_tri(x, a, b, c): return np.exp(-0.5 * ((x - b) / ((c - a) / 4.0)) ** 2) # Gaussian peaked at b with ~the triangle's support (+-2 sigma)
+
+fuzzy_input_mf = fuzzy_gaussmf_tri if USE_GAUSSIAN_MFS else fuzzy_trimf # Output terms stay triangular: the centroid relies on their cut points
+
+PEER_Z_BETTER_SAMPLED = fuzzy_zmf(peer_agreement_zscore_universe, 0.0, 0.5); PEER_Z_WORSE_SAMPLED = fuzzy_smf(peer_agreement_zscore_universe, 1.0, 2.0)
+
+# Rule activations are generated from rules_to_use at import, so the evaluators can't drift from the skfuzzy rule base.
+# Each output term's cut is an fmax over its rules, each rule an fmin/fmax tree over the membership names below.
+FUZZY_MEMBERSHIP_NAMES = {
+    ('device_reliability', 'low'): 'dev_low', ('device_reliability', 'medium'): 'dev_med', ('device_reliability', 'high'): 'dev_high',
+    ('data_consistency', 'poor'): 'cons_poor', ('predicted_noise_prop', 'high'): 'noise_high',
+    ('peer_agreement_zscore', 'better_than_peers'): 'peer_better', ('peer_agreement_zscore', 'similar_to_peers'): 'peer_similar', ('peer_agreement_zscore', 'worse_than_peers'): 'peer_worse',
+    ('passage_deviation', 'low'): 'pass_low', ('passage_deviation', 'medium'): 'pass_med', ('passage_deviation', 'high'): 'pass_high',
+}
+FUZZY_OUTPUT_TERMS = ('very_low', 'low', 'medium', 'high') # Column order of the cuts; matches TRUST_OUT_A/B/C
+
+def fuzzy_rule_expr(antecedent, fmin, fmax): # Source expression for one rule antecedent (Term or and/or TermAggregate)
+    if hasattr(antecedent, 'kind'): return f"{fmin if antecedent.kind == 'and' else fmax}({fuzzy_rule_expr(antecedent.term1, fmin, fmax)}, {fuzzy_rule_expr(antecedent.term2, fmin, fmax)})"
+    return FUZZY_MEMBERSHIP_NAMES[(antecedent.parent.label, antecedent.label)]
+
+def generate_rule_cuts_source(func_name, fmin, fmax, wrap_result): # Straight-line function: memberships in, one cut per output term out
+    rule_exprs = {term: [] for term in FUZZY_OUTPUT_TERMS}
+    for rule in rules_to_use:
+        for consequent in rule.consequent: rule_exprs[consequent.term.label].append(fuzzy_rule_expr(rule.antecedent, fmin, fmax))
+    cut_exprs = []
+    for term in FUZZY_OUTPUT_TERMS:
+        expr = rule_exprs[term][0] if rule_exprs[term] else "0.0"
+        for other in rule_exprs[term][1:]: expr = f"{fmax}({expr}, {other})"
+        cut_exprs.append(expr)
+    return f"def {func_name}({', '.join(FUZZY_MEMBERSHIP_NAMES.values())}):\n    return {wrap_result(', '.join(cut_exprs))}\n"
+
+fuzzy_codegen_namespace = {'np': np}
+exec(compile(generate_rule_cuts_source('fuzzy_rule_cuts_batch', 'np.fmin', 'np.fmax', lambda cuts: f"np.stack([{cuts}], axis=1)"), '<fuzzy_rules>', 'exec'), fuzzy_codegen_namespace)
+exec(compile(generate_rule_cuts_source('fuzzy_rule_cuts_scalar', 'min', 'max', lambda cuts: f"({cuts})"), '<fuzzy_rules>', 'exec'), fuzzy_codegen_namespace)
+fuzzy_rule_cuts_batch = fuzzy_codegen_namespace['fuzzy_rule_cuts_batch'] # (n,) memberships -> (n, 4) cuts
+
+def fuzzy_eval_batch(dev_rel, data_cons, noise, peer_z, pass_dev): # 1-D input arrays (one entry per sensor) -> (trust_output, rules_fired)
+    dev_rel = np.clip(dev_rel, device_reliability_universe[0], device_reliability_universe[-1]); data_cons = np.clip(data_cons, data_consistency_universe[0], data_consistency_universe[-1])
+    noise = np.clip(noise, predicted_noise_prop_universe[0], predicted_noise_prop_universe[-1]); peer_z = np.clip(peer_z, PEER_Z_MIN, PEER_Z_MAX); pass_dev = np.clip(pass_dev, passage_deviation_universe[0], PASSAGE_DEVIATION_MAX)
+    dev_low = fuzzy_input_mf(dev_rel, 0.0, 25.0, 50.0); dev_med = fuzzy_input_mf(dev_rel, 40.0, 60.0, 80.0); dev_high = fuzzy_input_mf(dev_rel, 70.0, 85.0, 100.0)
+    cons_poor = fuzzy_input_mf(data_cons, 0.0, 0.25, 0.5); noise_high = fuzzy_input_mf(noise, 0.5, 0.75, 1.0)
+    peer_better = np.interp(peer_z, peer_agreement_zscore_universe, PEER_Z_BETTER_SAMPLED); peer_similar = fuzzy_input_mf(peer_z, -0.5, 0.5, 1.5); peer_worse = np.interp(peer_z, peer_agreement_zscore_universe, PEER_Z_WORSE_SAMPLED)
+    pass_low = fuzzy_input_mf(pass_dev, 0.0, 3.0, 7.0); pass_med = fuzzy_input_mf(pass_dev, 5.0, 10.0, 15.0); pass_high = fuzzy_input_mf(pass_dev, 12.0, 20.0, 30.0)
+    cuts = fuzzy_rule_cuts_batch(dev_low, dev_med, dev_high, cons_poor, noise_high, peer_better, peer_similar, peer_worse, pass_low, pass_med, pass_high)
+    n = cuts.shape[0]
+    x = np.sort(np.concatenate([np.broadcast_to(TRUST_OUT_UNIVERSE, (n, TRUST_OUT_UNIVERSE.size)), TRUST_OUT_A + cuts * (TRUST_OUT_B - TRUST_OUT_A), TRUST_OUT_C - cuts * (TRUST_OUT_C - TRUST_OUT_B)], axis=1), axis=1)
+    y = np.max(np.minimum(cuts[:, :, None], fuzzy_trimf(x[:, None, :], TRUST_OUT_A[:, None], TRUST_OUT_B[:, None], TRUST_OUT_C[:, None])), axis=1)
+    dx = np.diff(x, axis=1); y1 = y[:, :-1]; y2 = y[:, 1:] # Piecewise-linear centroid, same trapezoid moments as skfuzzy's centroid()
+    area = 0.5 * dx * (y1 + y2); moment_area = dx * dx * (y2 + 0.5 * y1) / 3.0 + x[:, :-1] * area
+    total_area = area.sum(axis=1)
+    return moment_area.sum(axis=1) / np.fmax(total_area, FUZZY_EPS), total_area > 0
+
+FUZZY_INPUT_BOUNDS = np.array([[u[0], u[-1]] for u in (device_reliability_universe, data_consistency_universe, predicted_noise_prop_universe, peer_agreement_zscore_universe, passage_deviation_universe)], dtype=np.float64)
+
+if NUMBA_AVAILABLE:
+    fuzzy_rule_cuts_scalar = njit(inline='always')(fuzzy_codegen_namespace['fuzzy_rule_cuts_scalar'])
+
+    @njit(inline='always')
+    def fuzzy_trimf_scalar(x, a, b, c): return max(0.0, min((x - a) / (b - a), (c - x) / (c - b)))
+
+    @njit(cache=True, fastmath=True)
+    def fuzzy_eval_kernel(dev_rel, data_cons, noise, peer_z, pass_dev, bounds, z_universe, z_better, z_worse, out_universe, out_a, out_b, out_c):
+        n = dev_rel.shape[0]; m = out_universe.shape[0]; trust_out = np.empty(n); rules_fired = np.zeros(n, dtype=np.bool_)
+        cuts = np.empty(4); x = np.empty(m + 8)
+        for i in range(n):
+            d = min(max(dev_rel[i], bounds[0, 0]), bounds[0, 1]); dc = min(max(data_cons[i], bounds[1, 0]), bounds[1, 1]); nz = min(max(noise[i], bounds[2, 0]), bounds[2, 1])
+            z = min(max(peer_z[i], bounds[3, 0]), bounds[3, 1]); pd = min(max(pass_dev[i], bounds[4, 0]), bounds[4, 1])
+            dev_low = fuzzy_trimf_scalar(d, 0.0, 25.0, 50.0); dev_med = fuzzy_trimf_scalar(d, 40.0, 60.0, 80.0); dev_high = fuzzy_trimf_scalar(d, 70.0, 85.0, 100.0)
+            cons_poor = fuzzy_trimf_scalar(dc, 0.0, 0.25, 0.5); noise_high = fuzzy_trimf_scalar(nz, 0.5, 0.75, 1.0)
+            peer_better = np.interp(z, z_universe, z_better); peer_similar = fuzzy_trimf_scalar(z, -0.5, 0.5, 1.5); peer_worse = np.interp(z, z_universe, z_worse)
+            pass_low = fuzzy_trimf_scalar(pd, 0.0, 3.0, 7.0); pass_med = fuzzy_trimf_scalar(pd, 5.0, 10.0, 15.0); pass_high = fuzzy_trimf_scalar(pd, 12.0, 20.0, 30.0)
+            cuts[0], cuts[1], cuts[2], cuts[3] = fuzzy_rule_cuts_scalar(dev_low, dev_med, dev_high, cons_poor, noise_high, peer_better, peer_similar, peer_worse, pass_low, pass_med, pass_high)
+            x[:m] = out_universe
+            for k in range(4): x[m + k] = out_a[k] + cuts[k] * (out_b[k] - out_a[k]); x[m + 4 + k] = out_c[k] - cuts[k] * (out_c[k] - out_b[k])
+            xs = np.sort(x); sum_moment_area = 0.0; sum_area = 0.0; x1 = xs[0]; y1 = 0.0
+            for k in range(4): y1 = max(y1, min(cuts[k], fuzzy_trimf_scalar(x1, out_a[k], out_b[k], out_c[k])))
+            for j in range(1, m + 8):
+                x2 = xs[j]; y2 = 0.0
+                for k in range(4): y2 = max(y2, min(cuts[k], fuzzy_trimf_scalar(x2, out_a[k], out_b[k], out_c[k])))
+                dx = x2 - x1; area = 0.5 * dx * (y1 + y2)
+                sum_moment_area += dx * dx * (y2 + 0.5 * y1) / 3.0 + x1 * area; sum_area += area
+                x1 = x2; y1 = y2
+            trust_out[i] = sum_moment_area / max(sum_area, 2.220446049250313e-16); rules_fired[i] = sum_area > 0.0
+        return trust_out, rules_fired
+
+def fuzzy_eval(dev_rel, data_cons, noise, peer_z, pass_dev): # JIT kernel when numba is available, NumPy batch otherwise
+    if NUMBA_AVAILABLE and not USE_GAUSSIAN_MFS: return fuzzy_eval_kernel(dev_rel, data_cons, noise, peer_z, pass_dev, FUZZY_INPUT_BOUNDS, peer_agreement_zscore_universe, PEER_Z_BETTER_SAMPLED, PEER_Z_WORSE_SAMPLED, TRUST_OUT_UNIVERSE, TRUST_OUT_A, TRUST_OUT_B, TRUST_OUT_C)
+    return fuzzy_eval_batch(dev_rel, data_cons, noise, peer_z, pass_dev)
+
+if NUMBA_AVAILABLE: # Compile at import so the first evaluation cycle doesn't pay for it
+    try: fuzzy_eval(*np.zeros((5, 1), dtype=SENSOR_ARRAY_DTYPE)); print("TL Info: Numba fuzzy evaluator compiled.")
+    except Exception as e: NUMBA_AVAILABLE = False; print(f"TL Warning: Numba fuzzy evaluator unavailable ({e}); using NumPy.")
+
+def new_trust_simulation(): # Fresh, uncached simulation so skfuzzy's per-input caches can't accumulate in a long-running controller
+    return ctrl.ControlSystemSimulation(trust_ctrl_system, cache=False)
+
+def skfuzzy_trust_output(simulation, input_vals): # Per-sensor reference path, only used if the batch evaluator fails
+    simulation.input['device_reliability'] = input_vals[0]; simulation.input['data_consistency'] = input_vals[1]; simulation.input['predicted_noise_prop'] = input_vals[2]; simulation.input['peer_agreement_zscore'] = input_vals[3]; simulation.input['passage_deviation'] = input_vals[4]
+    simulation.compute(); return simulation.output.get('trust_update_output')
+
 # --- Global State ---
 my_node_id = None
 central_server_ip_address = None
 central_server_url_global = None
+ground_truth_url = None # Per-node central endpoints, built once by memoize_node_urls() after config load
+node_passage_url = None
+node_snapshot_url = None
+node_snapshot_supported = True # Cleared if /node_snapshot 404s but the legacy endpoints answer (older central server image)
+http_pool = urllib3.PoolManager(maxsize=IO_POOL_WORKERS, timeout=urllib3.Timeout(total=CENTRAL_QUERY_TIMEOUT_SECONDS), retries=False) # Keep-alive connections to the central server, reused every cycle
 sensor_static_and_ml_profiles_map = {} 
 state_lock = threading.Lock()
-sensor_data_trust_scores = {} 
-sensor_attributes = {} 
+sensor_attributes = {} # Load-time record per sensor IP; the per-cycle paths use the arrays below
 priority_edge_given_green_last_cycle = None
 expected_traffic_on_priority_edge_last_cycle = 0
 total_cycles_run = 0
 evaluated_cycles_count = 0
 correct_decision_cycles_count = 0
-initial_trust_scores_loaded_for_report = {} 
+last_cycle_was_idle = False # Idle cycles skip the ground-truth query, so the next cycle doesn't prefetch it either
 keep_running = True 
+full_sensor_map_cache = None # Parsed LIGHT_SENSOR_MAP_FILE, reused until the file's mtime changes
+full_sensor_map_mtime = None
+loaded_sensor_map_node_id = None # Node whose sensors are currently in sensor_attributes
+sensor_socket_timeval = struct.pack('ll', int(SENSOR_QUERY_TIMEOUT_SECONDS), int((SENSOR_QUERY_TIMEOUT_SECONDS % 1) * 1e6)) # struct timeval for SO_SNDTIMEO/SO_RCVTIMEO
+sensor_frame_buffer = bytearray(SENSOR_FRAME.size) # Reused by every sensor query (queries run serially in the main loop)
+legacy_text_protocol_sensors = set() # Sensor IPs that answered the binary request with a text error
+sensor_connections = {} # sensor_ip -> open binary-protocol socket, reused across cycles (main thread only)
+io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=IO_POOL_WORKERS, thread_name_prefix="tl-io") # Reused every cycle
+# Published sensor state: an immutable snapshot replaced wholesale (never mutated) by the map load and each trust update.
+# Readers take `snap = sensor_state` once and use it without locking; state_lock only serializes the writers.
+# Per-sensor arrays are row-aligned with 'ips'.
+EMPTY_SENSOR_STATE = {
+    'ips': (), # Sensor IPs, frozen at map load
+    'index': {}, # sensor_ip -> row
+    'edge_names': np.array([], dtype=str), # Edges of the loaded map, sorted so argmax ties resolve to the smallest name
+    'edge_idx': np.empty(0, dtype=np.int32), # Row -> index into edge_names
+    'reliability': np.empty(0, dtype=SENSOR_ARRAY_DTYPE), 'consistency': np.empty(0, dtype=SENSOR_ARRAY_DTYPE), 'noise': np.empty(0, dtype=SENSOR_ARRAY_DTYPE),
+    'trust': np.empty(0, dtype=SENSOR_ARRAY_DTYPE), # Current data trust
+    'initial_trust': np.empty(0, dtype=SENSOR_ARRAY_DTYPE), # ML-predicted trust at map load, for the report
+}
+sensor_state = EMPTY_SENSOR_STATE
 
 # --- Functions ---
 def get_node_id_from_file(): 
@@ -107,191 +309,392 @@ def load_central_server_ip_from_file():
         else: print(f"TL Error (Node {log_nid}): {TRAFFIC_SERVER_IP_FILE} is empty."); return False
     except Exception as e: print(f"TL Error (Node {log_nid}): reading {TRAFFIC_SERVER_IP_FILE}: {e}"); return False
 
+def read_full_sensor_map():
+    """Returns the parsed sensor map and whether it changed, only reparsing the JSON when the file's mtime moves."""
+    global full_sensor_map_cache, full_sensor_map_mtime
+    map_mtime = os.stat(LIGHT_SENSOR_MAP_FILE).st_mtime
+    if full_sensor_map_cache is not None and map_mtime == full_sensor_map_mtime:
+        return full_sensor_map_cache, False
+    with open(LIGHT_SENSOR_MAP_FILE, 'rb') as f: full_sensor_map_cache = json_loads(f.read())
+    full_sensor_map_mtime = map_mtime
+    return full_sensor_map_cache, True
+
 def load_sensor_map_and_attributes(node_id_val): 
-    global sensor_static_and_ml_profiles_map, sensor_data_trust_scores, sensor_attributes, initial_trust_scores_loaded_for_report
+    global sensor_static_and_ml_profiles_map, sensor_attributes, loaded_sensor_map_node_id, sensor_state
     if node_id_val is None: return False
     if not os.path.exists(LIGHT_SENSOR_MAP_FILE): print(f"TL Error (Node {node_id_val}): {LIGHT_SENSOR_MAP_FILE} not found."); return False
     try:
-        with open(LIGHT_SENSOR_MAP_FILE, 'r') as f: full_map_data = json.load(f)
+        full_map_data, map_changed = read_full_sensor_map()
+        if not map_changed and loaded_sensor_map_node_id == node_id_val: return True # Unchanged map already applied for this node
         node_id_str = str(node_id_val)
         if node_id_str in full_map_data:
             current_node_map_data = full_map_data[node_id_str]
+            reloading = loaded_sensor_map_node_id == node_id_val # Reload while running: keep learned trust
+            new_attributes = {} # Everything is built outside state_lock; the lock is only held to carry trust over and swap
+            edge_names_list = sorted(current_node_map_data.keys())
+            edge_position = {edge_str: idx for idx, edge_str in enumerate(edge_names_list)}
+            for edge_str, sensor_profiles_on_edge in current_node_map_data.items():
+                for sensor_profile in sensor_profiles_on_edge:
+                    sensor_ip = sensor_profile.get("ip")
+                    if not sensor_ip: print(f"TL Warning (Node {node_id_val}): Sensor IP missing on edge {edge_str}."); continue
+                    ml_initial_trust = sensor_profile.get('ml_initial_trust_score', FALLBACK_ML_INITIAL_TRUST_SCORE)
+                    new_attributes[sensor_ip] = {
+                        'ml_initial_trust_score': float(ml_initial_trust),
+                        'device_reliability': float(sensor_profile.get('ml_predicted_reliability', FALLBACK_DEVICE_RELIABILITY_MAP)),
+                        'predicted_noise_propensity': float(sensor_profile.get('ml_predicted_noise_propensity', FALLBACK_PREDICTED_NOISE_PROP_MAP)),
+                        'data_consistency': float(sensor_profile.get('ml_initial_data_consistency', FALLBACK_DATA_CONSISTENCY_MAP)),
+                        'edge_it_monitors': edge_str
+                    }
+            sensor_ips = tuple(new_attributes); attrs_in_order = [new_attributes[ip] for ip in sensor_ips]
+            initial_trust = np.array([a['ml_initial_trust_score'] for a in attrs_in_order], dtype=SENSOR_ARRAY_DTYPE)
+            new_state = {
+                'ips': sensor_ips, 'index': {ip: row for row, ip in enumerate(sensor_ips)},
+                'edge_names': np.array(edge_names_list, dtype=str),
+                'edge_idx': np.array([edge_position[a['edge_it_monitors']] for a in attrs_in_order], dtype=np.int32),
+                'reliability': np.array([a['device_reliability'] for a in attrs_in_order], dtype=SENSOR_ARRAY_DTYPE),
+                'consistency': np.array([a['data_consistency'] for a in attrs_in_order], dtype=SENSOR_ARRAY_DTYPE),
+                'noise': np.array([a['predicted_noise_propensity'] for a in attrs_in_order], dtype=SENSOR_ARRAY_DTYPE),
+                'trust': initial_trust, 'initial_trust': initial_trust, # Trust arrays are replaced, never written, so sharing one is safe
+            }
             with state_lock:
-                sensor_static_and_ml_profiles_map = current_node_map_data
-                sensor_data_trust_scores.clear(); sensor_attributes.clear(); initial_trust_scores_loaded_for_report.clear()
-                for edge_str, sensor_profiles_on_edge in current_node_map_data.items():
-                    for sensor_profile in sensor_profiles_on_edge:
-                        sensor_ip = sensor_profile.get("ip")
-                        if not sensor_ip: print(f"TL Warning (Node {node_id_val}): Sensor IP missing on edge {edge_str}."); continue
-                        ml_initial_trust = sensor_profile.get('ml_initial_trust_score', FALLBACK_ML_INITIAL_TRUST_SCORE)
-                        sensor_data_trust_scores[sensor_ip] = float(ml_initial_trust)
-                        initial_trust_scores_loaded_for_report[sensor_ip] = float(ml_initial_trust) 
-                        sensor_attributes[sensor_ip] = {
-                            'ml_initial_trust_score': float(ml_initial_trust),
-                            'device_reliability': float(sensor_profile.get('ml_predicted_reliability', FALLBACK_DEVICE_RELIABILITY_MAP)),
-                            'predicted_noise_propensity': float(sensor_profile.get('ml_predicted_noise_propensity', FALLBACK_PREDICTED_NOISE_PROP_MAP)),
-                            'data_consistency': float(sensor_profile.get('ml_initial_data_consistency', FALLBACK_DATA_CONSISTENCY_MAP)),
-                            'edge_it_monitors': edge_str
-                        }
-            print(f"TL Info (Node {node_id_val}): Sensor map and attributes loaded. Initial trust scores set from ML predictions (or fallback).")
+                previous_state = sensor_state if reloading else None # Read under the lock so a concurrent publish_trust isn't lost
+                if previous_state is not None:
+                    current_trust = initial_trust.copy()
+                    for row, sensor_ip in enumerate(sensor_ips):
+                        previous_row = previous_state['index'].get(sensor_ip)
+                        if previous_row is not None: current_trust[row] = previous_state['trust'][previous_row]
+                    new_state['trust'] = current_trust
+                sensor_static_and_ml_profiles_map = current_node_map_data; sensor_attributes = new_attributes
+                sensor_state = new_state; loaded_sensor_map_node_id = node_id_val
+            if previous_state is None: print(f"TL Info (Node {node_id_val}): Sensor map and attributes loaded. Initial trust scores set from ML predictions (or fallback).")
+            else: print(f"TL Info (Node {node_id_val}): Sensor map changed; reloaded {len(sensor_ips)} sensors (trust kept for those already known).")
             return True
         else:
             print(f"TL Warning (Node {node_id_val}): ID {node_id_str} not in {LIGHT_SENSOR_MAP_FILE}. No sensors configured.");
-            sensor_static_and_ml_profiles_map = {}; return False
+            sensor_static_and_ml_profiles_map = {}; sensor_state = EMPTY_SENSOR_STATE; loaded_sensor_map_node_id = None; return False
     except Exception as e:
         print(f"TL Error (Node {node_id_val}): loading {LIGHT_SENSOR_MAP_FILE}: {e}");
-        sensor_static_and_ml_profiles_map = {}; return False
+        if loaded_sensor_map_node_id == node_id_val: print(f"TL Warning (Node {node_id_val}): Keeping the previously loaded sensor map."); return True # e.g. file caught mid-write; retried next check
+        sensor_static_and_ml_profiles_map = {}; sensor_state = EMPTY_SENSOR_STATE; loaded_sensor_map_node_id = None; return False
+
+def recv_sensor_frame(sock): # Fills the preallocated frame buffer; a short read means the sensor closed early
+    view = memoryview(sensor_frame_buffer); received = 0
+    while received < SENSOR_FRAME.size:
+        n = sock.recv_into(view[received:])
+        if n == 0: break
+        received += n
+    return received
+
+def decode_sensor_frame(sensor_ip, frame, received): # Returns (reading, problem_msg); exactly one is None
+    if received == SENSOR_FRAME.size and frame[:5] != b"ERROR":
+        status, traffic_val = SENSOR_FRAME.unpack(frame)
+        if status & SENSOR_FRAME_FLAG_VALID: return {"traffic": traffic_val, "priority": bool(status & SENSOR_FRAME_FLAG_PRIORITY)}, None
+        return None, f"TL Error: Sensor {sensor_ip} returned invalid frame status {status:#04x}"
+    if received < SENSOR_FRAME.size: return None, f"TL Error: Short frame ({received}/{SENSOR_FRAME.size} bytes) from sensor {sensor_ip}"
+    legacy_text_protocol_sensors.add(sensor_ip) # Older sensor image rejected the binary request; answer in text from the next cycle
+    return None, f"TL Warning: Sensor {sensor_ip} does not speak the binary frame protocol; falling back to text"
+
+def parse_text_sensor_response(response_bytes): # Legacy "TRAFFIC=..;PRIORITY=.." reply from older sensor images, matched on the raw bytes
+    match = SENSOR_TEXT_RESPONSE_RE.search(response_bytes)
+    if match is None: return None, False
+    return int(match.group(1)), match.group(2) is not None and match.group(2).lower() == b'true'
+
+def tune_sensor_socket(sock): # Disable Nagle so the 1-byte request goes out immediately; keepalive notices sensors that vanish between cycles
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1); sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SENSOR_SOCKET_BUFFER_BYTES); sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SENSOR_SOCKET_BUFFER_BYTES)
 
-def query_sensor_raw(sensor_ip, port): 
+def open_sensor_connection(sensor_ip, port, request_bytes): # Returns a connected socket with request_bytes already sent
+    if not USE_TCP_FASTOPEN:
+        sock = socket.create_connection((sensor_ip, port), timeout=SENSOR_QUERY_TIMEOUT_SECONDS)
+        try: tune_sensor_socket(sock); sock.sendall(request_bytes); return sock
+        except: sock.close(); raise
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try: # TFO needs a blocking socket (non-blocking sendto returns EINPROGRESS without sending); kernel timeouts bound connect and recv instead
+        tune_sensor_socket(sock); sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, sensor_socket_timeval); sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, sensor_socket_timeval)
+        sock.sendto(request_bytes, socket.MSG_FASTOPEN, (sensor_ip, port)); return sock
+    except: sock.close(); raise
+
+def drain_sensor_socket(sock): # Closing with unread bytes makes the kernel send RST; consume whatever has arrived first
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, SENSOR_SOCKET_LINGER); sock.setblocking(False)
+        while sock.recv(4096): pass
+    except OSError: pass # BlockingIOError once the receive queue is empty
+
+def take_sensor_connection(sensor_ip): # Kept-open socket for this sensor if it is still usable, else None
+    sock = sensor_connections.pop(sensor_ip, None)
+    if sock is None: return None
+    try: sock.recv(1, socket.MSG_PEEK) # Anything readable now is EOF (sensor idle-closed it) or stale bytes; either way don't reuse
+    except BlockingIOError: return sock # Nothing pending: connection is alive and in sync
+    except OSError: pass
+    sock.close(); return None
+
+def close_sensor_connections():
+    for sock in sensor_connections.values(): sock.close()
+    sensor_connections.clear()
+
+def query_sensor_raw(sensor_ip, port, log_lines=None): # Problems go to log_lines (emitted once per cycle by the caller) when given
     try:
-        with socket.create_connection((sensor_ip, port), timeout=SENSOR_QUERY_TIMEOUT_SECONDS) as sock:
-            sock.sendall(b"GET_TRAFFIC\n"); response_bytes = sock.recv(1024)
-            response_str = response_bytes.decode('utf-8').strip(); parts = response_str.split(';')
-            traffic_val = None; priority_val = False
-            for part in parts:
-                part = part.strip()
-                if part.startswith("TRAFFIC="):
-                    try: traffic_val = int(part.split('=', 1)[1])
-                    except: pass
-                elif part.startswith("PRIORITY="):
-                    try: priority_val = part.split('=', 1)[1].lower() == 'true'
-                    except: pass
-            if traffic_val is not None: return {"traffic": traffic_val, "priority": priority_val}
-            else: print(f"TL Error: Malformed/missing TRAFFIC from sensor {sensor_ip}. Resp: '{response_str}'"); return None
-    except socket.timeout: print(f"TL Warning: Timeout sensor {sensor_ip}:{port}"); return None
-    except socket.error as e: print(f"TL Warning: Socket error sensor {sensor_ip}:{port} - {e}"); return None
-    except Exception as e: print(f"TL Warning: Unexpected error sensor {sensor_ip}:{port} - {e}"); return None
+        use_text_protocol = sensor_ip in legacy_text_protocol_sensors
+        with open_sensor_connection(sensor_ip, port, b"GET_TRAFFIC\n" if use_text_protocol else SENSOR_FRAME_REQUEST) as sock:
+            try:
+                if not use_text_protocol:
+                    received = recv_sensor_frame(sock); reading, problem_msg = decode_sensor_frame(sensor_ip, sensor_frame_buffer, received)
+                    if reading is not None: return reading
+                    if sensor_ip in legacy_text_protocol_sensors: drain_sensor_socket(sock)
+                else:
+                    response_bytes = sock.recv(1024)
+                    traffic_val, priority_val = parse_text_sensor_response(response_bytes)
+                    if traffic_val is not None: return {"traffic": traffic_val, "priority": priority_val}
+                    else: problem_msg = f"TL Error: Malformed/missing TRAFFIC from sensor {sensor_ip}. Resp: '{response_bytes.decode('utf-8', 'replace').strip()}'"
+            except (socket.timeout, BlockingIOError): drain_sensor_socket(sock); raise # Late reply is consumed so close sends FIN, not RST
+    except (socket.timeout, BlockingIOError): problem_msg = f"TL Warning: Timeout sensor {sensor_ip}:{port}" # BlockingIOError: SO_SNDTIMEO/SO_RCVTIMEO expiry on the TFO path
+    except socket.error as e: problem_msg = f"TL Warning: Socket error sensor {sensor_ip}:{port} - {e}"
+    except Exception as e: problem_msg = f"TL Warning: Unexpected error sensor {sensor_ip}:{port} - {e}"
+    if log_lines is not None: log_lines.append(problem_msg)
+    else: print(problem_msg)
+    return None
+
+def query_sensors_concurrently(sensor_ips, port, log_lines): # Non-blocking connect/send/recv for all sensors driven by one selector
+    results = dict.fromkeys(sensor_ips); sel = selectors.DefaultSelector(); legacy_futures = {}
+    if len(sensor_connections) > len(sensor_ips): # Sensor map changed; drop connections to sensors no longer queried
+        for sensor_ip in sensor_connections.keys() - set(sensor_ips): sensor_connections.pop(sensor_ip).close()
+    try:
+        for sensor_ip in sensor_ips:
+            if sensor_ip in legacy_text_protocol_sensors: legacy_futures[sensor_ip] = io_pool.submit(query_sensor_raw, sensor_ip, port, log_lines); continue # Blocking text query runs alongside the selector loop
+            sock = take_sensor_connection(sensor_ip)
+            if sock is not None: # Persistent connection: request goes straight out, no handshake
+                try: sock.send(SENSOR_FRAME_REQUEST); sel.register(sock, selectors.EVENT_READ, {"ip": sensor_ip, "frame": bytearray(SENSOR_FRAME.size), "received": 0}); continue
+                except OSError: sock.close() # Broken since last cycle; reconnect below
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                tune_sensor_socket(sock); sock.setblocking(False)
+                if USE_TCP_FASTOPEN:
+                    try: sock.setsockopt(socket.IPPROTO_TCP, TCP_FASTOPEN_CONNECT, 1)
+                    except OSError: pass
+                connect_err = sock.connect_ex((sensor_ip, port))
+                if connect_err not in (0, errno.EINPROGRESS): raise OSError(connect_err, os.strerror(connect_err))
+                sel.register(sock, selectors.EVENT_WRITE, {"ip": sensor_ip, "frame": bytearray(SENSOR_FRAME.size), "received": 0})
+            except OSError as e: sock.close(); log_lines.append(f"TL Warning: Socket error sensor {sensor_ip}:{port} - {e}")
+        deadline = time.monotonic() + SENSOR_QUERY_TIMEOUT_SECONDS
+        while sel.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: break
+            for key, mask in sel.select(remaining):
+                sock = key.fileobj; state = key.data; sensor_ip = state["ip"]
+                try:
+                    if mask & selectors.EVENT_WRITE: # Connect finished (or failed); send the 1-byte request and wait for the frame
+                        connect_err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                        if connect_err: raise OSError(connect_err, os.strerror(connect_err))
+                        sock.send(SENSOR_FRAME_REQUEST); sel.modify(sock, selectors.EVENT_READ, state); continue
+                    n = sock.recv_into(memoryview(state["frame"])[state["received"]:])
+                    state["received"] += n
+                    if n and state["received"] < SENSOR_FRAME.size: continue # Partial frame; wait for the rest
+                    results[sensor_ip], problem_msg = decode_sensor_frame(sensor_ip, state["frame"], state["received"])
+                    if problem_msg: log_lines.append(problem_msg)
+                    if results[sensor_ip] is not None: sel.unregister(sock); sensor_connections[sensor_ip] = sock; continue # Keep it open for the next cycle
+                    if sensor_ip in legacy_text_protocol_sensors: drain_sensor_socket(sock)
+                except BlockingIOError: continue
+                except OSError as e: log_lines.append(f"TL Warning: Socket error sensor {sensor_ip}:{port} - {e}")
+                sel.unregister(sock); sock.close()
+        for key in list(sel.get_map().values()): # Still pending at the deadline
+            log_lines.append(f"TL Warning: Timeout sensor {key.data['ip']}:{port}")
+            sel.unregister(key.fileobj); drain_sensor_socket(key.fileobj); key.fileobj.close()
+        for sensor_ip, future in legacy_futures.items(): results[sensor_ip] = future.result() # query_sensor_raw bounds itself by the socket timeout
+    finally: sel.close()
+    return results
 
 def get_local_sensor_readings(): 
-    if not sensor_attributes: return {}
-    sensor_ip_to_reading_map = {}; sensors_to_query = []
-    with state_lock: sensors_to_query = list(sensor_attributes.keys())
+    sensors_to_query = sensor_state['ips']
     if not sensors_to_query: return {}
-    for sensor_ip in sensors_to_query:
-        sensor_ip_to_reading_map[sensor_ip] = query_sensor_raw(sensor_ip, SENSOR_LISTEN_PORT)
+    sensor_log_lines = []
+    sensor_ip_to_reading_map = query_sensors_concurrently(sensors_to_query, SENSOR_LISTEN_PORT, sensor_log_lines)
     if all(v is None for v in sensor_ip_to_reading_map.values()) and sensor_ip_to_reading_map:
-        print(f"TL Warning (Node {my_node_id}): Failed to get valid readings from ANY local sensor this cycle.")
+        sensor_log_lines.append(f"TL Warning (Node {my_node_id}): Failed to get valid readings from ANY local sensor this cycle.")
+    if sensor_log_lines: log.warning("\n".join(sensor_log_lines))
     return sensor_ip_to_reading_map
 
+def memoize_node_urls(): 
+    global ground_truth_url, node_passage_url, node_snapshot_url
+    if my_node_id is None or central_server_url_global is None: return
+    ground_truth_url = f"{central_server_url_global}/approaching_traffic/{my_node_id}"
+    node_passage_url = f"{central_server_url_global}/passed_through_node_count/{my_node_id}"
+    node_snapshot_url = f"{central_server_url_global}/node_snapshot/{my_node_id}"
+
+def central_get_json(target_url): # Raises on transport errors and HTTP error statuses; callers catch broadly
+    response = http_pool.request('GET', target_url)
+    if response.status >= 400: raise urllib3.exceptions.HTTPError(f"HTTP {response.status} from {target_url}")
+    return json_loads(response.data)
+
 def get_ground_truth_traffic_per_edge(node_id_val): 
     if node_id_val is None or central_server_url_global is None: return None
-    target_url = f"{central_server_url_global}/approaching_traffic/{node_id_val}"
+    target_url = ground_truth_url if node_id_val == my_node_id and ground_truth_url else f"{central_server_url_global}/approaching_traffic/{node_id_val}"
     try:
-        response = requests.get(target_url, timeout=CENTRAL_QUERY_TIMEOUT_SECONDS); response.raise_for_status()
-        data = response.json(); return data.get("traffic_per_approach", {})
+        data = central_get_json(target_url); return data.get("traffic_per_approach", {})
     except Exception: return None
 
 def get_confirmed_node_passage(node_id_val): 
     if node_id_val is None or central_server_url_global is None: return None
-    target_url = f"{central_server_url_global}/passed_through_node_count/{node_id_val}"
+    target_url = node_passage_url if node_id_val == my_node_id and node_passage_url else f"{central_server_url_global}/passed_through_node_count/{node_id_val}"
     try:
-        response = requests.get(target_url, timeout=CENTRAL_QUERY_TIMEOUT_SECONDS); response.raise_for_status()
-        data = response.json(); return data.get("cars_passed_through_last_step")
+        data = central_get_json(target_url); return data.get("cars_passed_through_last_step")
     except Exception: return None
 
-def update_trust_scores(local_sensor_readings_map, confirmed_passage_at_node): 
-    global sensor_data_trust_scores, sensor_attributes, trust_simulation_instance, priority_edge_given_green_last_cycle, expected_traffic_on_priority_edge_last_cycle
-    if not sensor_attributes: return
-    if trust_simulation_instance is None: print(f"TL Warning (Node {my_node_id}): Fuzzy system not available."); return
-    trusted_peer_readings_traffic = []; sensor_traffic_reports = {}
-    with state_lock: current_trust_map_for_peer_calc = sensor_data_trust_scores.copy()
-    for sensor_ip, reading_dict in local_sensor_readings_map.items():
-        if reading_dict and reading_dict.get("traffic") is not None and 0 <= reading_dict["traffic"] <= MAX_PLAUSIBLE_TRAFFIC:
-            sensor_traffic_reports[sensor_ip] = reading_dict["traffic"]
-            if current_trust_map_for_peer_calc.get(sensor_ip, 0) >= CONGESTION_TRUST_THRESHOLD: trusted_peer_readings_traffic.append(reading_dict["traffic"])
-    mean_trusted_peer_traffic = np.mean(trusted_peer_readings_traffic) if trusted_peer_readings_traffic else None
-    std_trusted_peer_traffic = np.std(trusted_peer_readings_traffic) if len(trusted_peer_readings_traffic) > 1 else 0.0
+def get_node_snapshot(node_id_val): # {"traffic_per_approach": ..., "cars_passed_through_last_step": ...} in one request (None values where a legacy query failed), or None
+    global node_snapshot_supported
+    if node_id_val is None or central_server_url_global is None: return None
+    if node_snapshot_supported:
+        target_url = node_snapshot_url if node_id_val == my_node_id and node_snapshot_url else f"{central_server_url_global}/node_snapshot/{node_id_val}"
+        try:
+            response = http_pool.request('GET', target_url)
+            if response.status != 404:
+                if response.status >= 400: return None
+                data = json_loads(response.data)
+                return {"traffic_per_approach": data.get("traffic_per_approach", {}), "cars_passed_through_last_step": data.get("cars_passed_through_last_step")}
+        except Exception: return None
+    # Legacy endpoints, queried independently so one failing doesn't discard the other's value
+    traffic_per_approach = get_ground_truth_traffic_per_edge(node_id_val); cars_passed = get_confirmed_node_passage(node_id_val)
+    if traffic_per_approach is None and cars_passed is None: return None
+    if node_snapshot_supported and traffic_per_approach is not None: # Legacy traffic endpoint works, so the 404 was the missing snapshot endpoint (not an unknown node)
+        print(f"TL Info (Node {node_id_val}): Central server has no /node_snapshot endpoint; using separate queries."); node_snapshot_supported = False
+    return {"traffic_per_approach": traffic_per_approach, "cars_passed_through_last_step": cars_passed}
+
+def trust_scores_by_ip(): # Dict view of the published trust for logging and reports
+    snap = sensor_state; return dict(zip(snap['ips'], snap['trust'].tolist()))
+
+def publish_trust(snap, new_trust):
+    global sensor_state
+    np.clip(new_trust, TRUST_FLOOR, TRUST_CEILING, out=new_trust)
     with state_lock:
-        for sensor_ip, attrs in sensor_attributes.items():
-            current_data_trust = sensor_data_trust_scores.get(sensor_ip, FALLBACK_ML_INITIAL_TRUST_SCORE); new_data_trust = current_data_trust
-            static_device_reliability = attrs.get('device_reliability', FALLBACK_DEVICE_RELIABILITY_MAP); static_data_consistency = attrs.get('data_consistency', FALLBACK_DATA_CONSISTENCY_MAP); static_predicted_noise_prop = attrs.get('predicted_noise_propensity', FALLBACK_PREDICTED_NOISE_PROP_MAP)
-            peer_agreement_zscore_val = 0.0; sensor_reported_traffic_this_cycle = sensor_traffic_reports.get(sensor_ip)
-            if sensor_reported_traffic_this_cycle is not None and mean_trusted_peer_traffic is not None:
-                deviation_from_peer_mean = abs(sensor_reported_traffic_this_cycle - mean_trusted_peer_traffic)
-                if std_trusted_peer_traffic > 0.001: peer_agreement_zscore_val = deviation_from_peer_mean / std_trusted_peer_traffic
-                elif deviation_from_peer_mean > 0: peer_agreement_zscore_val = 3.0 
-                peer_agreement_zscore_val = np.clip(peer_agreement_zscore_val, peer_agreement_zscore_ant.universe[0], peer_agreement_zscore_ant.universe[-1])
-            current_passage_deviation_val_for_fuzzy = None; monitored_edge_for_this_sensor = attrs.get('edge_it_monitors')
-            if confirmed_passage_at_node is not None and priority_edge_given_green_last_cycle == monitored_edge_for_this_sensor and expected_traffic_on_priority_edge_last_cycle is not None:
-                passage_dev = abs(confirmed_passage_at_node - expected_traffic_on_priority_edge_last_cycle); current_passage_deviation_val_for_fuzzy = min(passage_dev, passage_deviation_ant.universe[-1])
-            input_val_device_reliability = static_device_reliability; input_val_data_consistency = static_data_consistency; input_val_predicted_noise_prop = static_predicted_noise_prop; input_val_peer_agreement_zscore = peer_agreement_zscore_val; input_val_passage_deviation = current_passage_deviation_val_for_fuzzy if current_passage_deviation_val_for_fuzzy is not None else DEFAULT_PASSAGE_DEVIATION_INPUT
-            # print(f"    TL DEBUG Fuzzy Inputs for {sensor_ip}: dev_rel={input_val_device_reliability:.2f}, data_cons={input_val_data_consistency:.2f}, noise_prop={input_val_predicted_noise_prop:.2f}, peer_zscore={input_val_peer_agreement_zscore:.2f}, pass_dev={input_val_passage_deviation:.2f}")
-            fuzzy_trust_output = None
-            if sensor_reported_traffic_this_cycle is not None or current_passage_deviation_val_for_fuzzy is not None:
-                try:
-                    trust_simulation_instance.input['device_reliability'] = input_val_device_reliability; trust_simulation_instance.input['data_consistency'] = input_val_data_consistency; trust_simulation_instance.input['predicted_noise_prop'] = input_val_predicted_noise_prop; trust_simulation_instance.input['peer_agreement_zscore'] = input_val_peer_agreement_zscore; trust_simulation_instance.input['passage_deviation'] = input_val_passage_deviation
-                    trust_simulation_instance.compute()
-                    if 'trust_update_output' in trust_simulation_instance.output and trust_simulation_instance.output['trust_update_output'] is not None:
-                        fuzzy_trust_output = trust_simulation_instance.output['trust_update_output']
-                        # print(f"    TL DEBUG Fuzzy Output for {sensor_ip}: {fuzzy_trust_output:.2f}")
-                        new_data_trust = (1 - TRUST_UPDATE_ALPHA) * current_data_trust + TRUST_UPDATE_ALPHA * fuzzy_trust_output
-                    else: print(f"    TL WARNING FUZZY for {sensor_ip}: No rules fired or output is None. Output dict: {trust_simulation_instance.output}. Penalizing."); new_data_trust -= TRUST_DECAY_FUZZY_ERROR 
-                except Exception as e: print(f"    TL ERROR FUZZY compute for {sensor_ip}: {e}. Penalizing."); new_data_trust -= TRUST_DECAY_FUZZY_ERROR
-            current_reading_dict = local_sensor_readings_map.get(sensor_ip)
-            if current_reading_dict is None: new_data_trust -= TRUST_DECAY_FAILURE
-            elif current_reading_dict.get("traffic") is None: new_data_trust -= TRUST_DECAY_FAILURE * 0.5 
-            elif not (0 <= current_reading_dict.get("traffic", -1) <= MAX_PLAUSIBLE_TRAFFIC): new_data_trust -= TRUST_DECAY_IMPLAUSIBLE
-            sensor_data_trust_scores[sensor_ip] = max(TRUST_FLOOR, min(TRUST_CEILING, new_data_trust))
+        if sensor_state is snap: sensor_state = {**snap, 'trust': new_trust} # Skip if the map was reloaded meanwhile
+
+def update_trust_scores(local_sensor_readings_map, confirmed_passage_at_node): 
+    snap = sensor_state; sensor_ips = snap['ips']; current_trust = snap['trust']; dev_rel = snap['reliability']; data_cons = snap['consistency']; noise_prop = snap['noise']; edge_idx = snap['edge_idx']; edge_names = snap['edge_names']
+    if not sensor_ips: return
+    traffic = np.full(len(sensor_ips), np.nan, dtype=SENSOR_ARRAY_DTYPE); reading_missing = np.zeros(len(sensor_ips), dtype=bool); traffic_missing = np.zeros(len(sensor_ips), dtype=bool)
+    for row, sensor_ip in enumerate(sensor_ips):
+        reading_dict = local_sensor_readings_map.get(sensor_ip)
+        if reading_dict is None: reading_missing[row] = True
+        elif reading_dict.get("traffic") is None: traffic_missing[row] = True
+        else: traffic[row] = reading_dict["traffic"]
+    plausible = (traffic >= 0) & (traffic <= MAX_PLAUSIBLE_TRAFFIC) # NaN (no reading) compares False
+    reading_penalty = np.where(reading_missing, TRUST_DECAY_FAILURE, np.where(traffic_missing, TRUST_DECAY_FAILURE * 0.5, np.where(~np.isnan(traffic) & ~plausible, TRUST_DECAY_IMPLAUSIBLE, 0.0)))
+    passage_known = confirmed_passage_at_node is not None and priority_edge_given_green_last_cycle is not None and expected_traffic_on_priority_edge_last_cycle is not None
+    if not passage_known and not plausible.any(): publish_trust(snap, (current_trust - reading_penalty).astype(SENSOR_ARRAY_DTYPE)); return # Nothing for the fuzzy rules to judge (e.g. all sensors down)
+    trusted_peer_traffic = traffic[plausible & (current_trust >= CONGESTION_TRUST_THRESHOLD)]
+    peer_zscore = np.zeros(len(sensor_ips), dtype=SENSOR_ARRAY_DTYPE)
+    if trusted_peer_traffic.size:
+        mean_trusted_peer_traffic = trusted_peer_traffic.mean(); std_trusted_peer_traffic = trusted_peer_traffic.std() if trusted_peer_traffic.size > 1 else 0.0
+        deviation_from_peer_mean = np.abs(traffic[plausible] - mean_trusted_peer_traffic)
+        if std_trusted_peer_traffic > 0.001: peer_zscore[plausible] = deviation_from_peer_mean / std_trusted_peer_traffic
+        else: peer_zscore[plausible] = np.where(deviation_from_peer_mean > 0, 3.0, 0.0)
+        np.clip(peer_zscore, PEER_Z_MIN, PEER_Z_MAX, out=peer_zscore)
+    passage_deviation = np.full(len(sensor_ips), DEFAULT_PASSAGE_DEVIATION_INPUT, dtype=SENSOR_ARRAY_DTYPE); has_passage = np.zeros(len(sensor_ips), dtype=bool)
+    if passage_known:
+        has_passage = (edge_names == priority_edge_given_green_last_cycle)[edge_idx]
+        passage_deviation[has_passage] = min(abs(confirmed_passage_at_node - expected_traffic_on_priority_edge_last_cycle), PASSAGE_DEVIATION_MAX)
+    needs_fuzzy = plausible | has_passage
+    fuzzy_output = np.full(len(sensor_ips), np.nan, dtype=SENSOR_ARRAY_DTYPE) # NaN where no rule fired / compute failed
+    if needs_fuzzy.any():
+        fuzzy_inputs = (dev_rel[needs_fuzzy], data_cons[needs_fuzzy], noise_prop[needs_fuzzy], peer_zscore[needs_fuzzy], passage_deviation[needs_fuzzy])
+        try:
+            trust_outputs, rules_fired = fuzzy_eval(*fuzzy_inputs)
+            fuzzy_output[needs_fuzzy] = np.where(rules_fired, trust_outputs, np.nan)
+        except Exception as e:
+            log.warning("    TL ERROR FUZZY batch compute: %s. Falling back to per-sensor skfuzzy.", e)
+            simulation = new_trust_simulation() if trust_ctrl_system is not None else None
+            for row, input_vals in zip(np.flatnonzero(needs_fuzzy), zip(*fuzzy_inputs)):
+                try: sk_output = skfuzzy_trust_output(simulation, input_vals) if simulation is not None else None
+                except Exception as sk_e: log.warning("    TL ERROR FUZZY compute for %s: %s.", sensor_ips[row], sk_e); sk_output = None
+                if sk_output is not None: fuzzy_output[row] = sk_output
+    fuzzy_failed = needs_fuzzy & np.isnan(fuzzy_output)
+    for row in np.flatnonzero(fuzzy_failed): log.warning("    TL WARNING FUZZY for %s: No rules fired or output is None. Penalizing.", sensor_ips[row])
+    new_trust = np.where(needs_fuzzy & ~fuzzy_failed, (1 - TRUST_UPDATE_ALPHA) * current_trust + TRUST_UPDATE_ALPHA * np.nan_to_num(fuzzy_output), current_trust).astype(SENSOR_ARRAY_DTYPE) # Python-float constants keep float32 arrays float32
+    new_trust -= np.where(fuzzy_failed, TRUST_DECAY_FUZZY_ERROR, 0.0)
+    new_trust -= reading_penalty
+    publish_trust(snap, new_trust)
+
+@functools.lru_cache(maxsize=1024) # The node's edge names are a small fixed set, so each is parsed once
+def edge_key(edge_name): # "7-3" -> (3, 7), compared as ints without re-formatting; None if it isn't a dash-separated list of node ids
+    try: return tuple(sorted(int(n) for n in edge_name.split('-')))
+    except ValueError: return None
+
+def edge_label(key): return "-".join(map(str, key)) if key else None # Canonical "a-b" text, only built for output
 
 def predict_priority_edge(local_sensor_readings_map): 
     if not local_sensor_readings_map: return None
-    trusted_priority_alerts = []
-    with state_lock: current_trust_map = sensor_data_trust_scores.copy(); current_attributes_map = sensor_attributes.copy()
-    for sensor_ip, reading_dict in local_sensor_readings_map.items():
+    snap = sensor_state; current_trust = snap['trust']; edge_idx = snap['edge_idx']; edge_names = snap['edge_names']
+    traffic = np.full(len(snap['ips']), np.nan); priority = np.zeros(len(snap['ips']), dtype=bool) # NaN: no reading / no traffic value
+    for row, sensor_ip in enumerate(snap['ips']):
+        reading_dict = local_sensor_readings_map.get(sensor_ip)
         if reading_dict is None: continue
-        reported_priority = reading_dict.get("priority", False); reported_traffic = reading_dict.get("traffic", 0) 
-        if reported_priority:
-            trust_score = current_trust_map.get(sensor_ip, 0)
-            if trust_score >= PRIORITY_SIGNAL_TRUST_THRESHOLD: 
-                attrs = current_attributes_map.get(sensor_ip)
-                if attrs and 'edge_it_monitors' in attrs:
-                    edge_str = attrs['edge_it_monitors']; traffic_for_sort = reported_traffic if reported_traffic is not None else -1
-                    trusted_priority_alerts.append({'trust': trust_score, 'traffic': traffic_for_sort, 'edge': edge_str, 'sensor_ip': sensor_ip})
-    if trusted_priority_alerts:
-        trusted_priority_alerts.sort(key=lambda x: (x['trust'], x['traffic']), reverse=True)
-        return trusted_priority_alerts[0]['edge']
-    edge_to_trusted_sum = {}; edge_to_trusted_sensor_count = {}
-    for sensor_ip, reading_dict in local_sensor_readings_map.items():
-        if reading_dict is None or reading_dict.get("traffic") is None or reading_dict.get("traffic", -1) < 0: continue
-        traffic_count = reading_dict["traffic"]; trust_score = current_trust_map.get(sensor_ip, 0)
-        if trust_score >= CONGESTION_TRUST_THRESHOLD: 
-            attrs = current_attributes_map.get(sensor_ip)
-            if attrs and 'edge_it_monitors' in attrs:
-                edge_str = attrs['edge_it_monitors']
-                edge_to_trusted_sum[edge_str] = edge_to_trusted_sum.get(edge_str, 0) + traffic_count
-                edge_to_trusted_sensor_count[edge_str] = edge_to_trusted_sensor_count.get(edge_str, 0) + 1
-    if not edge_to_trusted_sum: return None
-    edge_to_avg_trusted_reading = { edge: total_sum / edge_to_trusted_sensor_count[edge] for edge, total_sum in edge_to_trusted_sum.items() if edge_to_trusted_sensor_count.get(edge, 0) > 0 }
-    if not edge_to_avg_trusted_reading: return None
-    try:
-        max_avg_reading = -1.0 
-        for avg_val in edge_to_avg_trusted_reading.values():
-            if avg_val > max_avg_reading: max_avg_reading = avg_val
-        if max_avg_reading < 0 : return None 
-        candidate_priority_edges = [edge for edge, avg_val in edge_to_avg_trusted_reading.items() if abs(avg_val - max_avg_reading) < 1e-9] 
-        if not candidate_priority_edges: return None
-        return sorted(candidate_priority_edges)[0]
-    except ValueError: return None
+        if reading_dict.get("traffic") is not None: traffic[row] = reading_dict["traffic"]
+        priority[row] = bool(reading_dict.get("priority", False))
+    alert_rows = np.flatnonzero(priority & (current_trust >= PRIORITY_SIGNAL_TRUST_THRESHOLD))
+    if alert_rows.size: # Highest (trust, traffic) trusted priority alert wins; ties go to the first sensor
+        best = np.lexsort((-alert_rows, np.nan_to_num(traffic[alert_rows], nan=-1.0), current_trust[alert_rows]))[-1]
+        return str(edge_names[edge_idx[alert_rows[best]]])
+    counted = (traffic >= 0) & (current_trust >= CONGESTION_TRUST_THRESHOLD) # NaN compares False
+    edge_sums = np.bincount(edge_idx, weights=np.where(counted, traffic, 0.0), minlength=len(edge_names))
+    edge_counts = np.bincount(edge_idx, weights=counted, minlength=len(edge_names))
+    has_readings = edge_counts > 0
+    if not has_readings.any() or edge_sums.max() <= 0: return None # Idle intersection: no trusted traffic anywhere, so no action
+    edge_avgs = np.where(has_readings, edge_sums / np.maximum(edge_counts, 1), -1.0)
+    return str(edge_names[np.argmax(edge_avgs)]) # argmax returns the first max, i.e. the lexicographically smallest tied edge
 
 def write_performance_report():
-    global my_node_id, evaluated_cycles_count, correct_decision_cycles_count, initial_trust_scores_loaded_for_report
+    global my_node_id, evaluated_cycles_count, correct_decision_cycles_count
     if my_node_id is None: print("TL Report Error: Node ID is None, cannot write report."); return
     success_ratio = 0.0
     if evaluated_cycles_count > 0: success_ratio = correct_decision_cycles_count / evaluated_cycles_count
     report_data = {
         "node_id": my_node_id, "total_evaluated_cycles": evaluated_cycles_count,
         "correct_decision_cycles": correct_decision_cycles_count, "success_ratio": round(success_ratio, 4),
-        "initial_trust_scores_used": initial_trust_scores_loaded_for_report
+        "initial_trust_scores_used": {ip: round(trust, 4) for ip, trust in zip(sensor_state['ips'], sensor_state['initial_trust'].tolist())} # Rounded so float32 noise doesn't reach the report
     }
     if not os.path.exists(RESULTS_DIR):
         try: os.makedirs(RESULTS_DIR); print(f"TL Info (Node {my_node_id}): Created results directory {RESULTS_DIR}")
         except OSError as e: print(f"TL Report Error (Node {my_node_id}): Could not create results directory {RESULTS_DIR}: {e}"); return
     report_filepath = os.path.join(RESULTS_DIR, f"tl_{my_node_id}_results.json")
     try:
-        with open(report_filepath, 'w') as f: json.dump(report_data, f, indent=4)
+        with open(report_filepath, 'wb') as f: f.write(json_dumps_report(report_data))
         print(f"TL Info (Node {my_node_id}): Performance report written to {report_filepath}")
     except IOError as e: print(f"TL Report Error (Node {my_node_id}): Could not write report to {report_filepath}: {e}")
 
+def create_config_watcher():
+    # Event-driven wakeup for the startup config wait; None means fall back to polling
+    if not INOTIFY_AVAILABLE: return None
+    watch_dirs = {os.path.dirname(NODE_ID_FILE), os.path.dirname(TRAFFIC_SERVER_IP_FILE), os.path.dirname(LIGHT_SENSOR_MAP_FILE)}
+    if not all(os.path.isdir(d) for d in watch_dirs): return None # Can't watch a directory that doesn't exist yet
+    try:
+        watcher = INotify()
+        for watch_dir in watch_dirs: watcher.add_watch(watch_dir, inotify_flags.CREATE | inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+        return watcher
+    except OSError as e: print(f"TL Warning: inotify unavailable ({e}), polling for config files instead."); return None
+
+def wait_for_config_change(watcher, deadline):
+    if watcher is None: time.sleep(CONFIG_CHECK_INTERVAL_SECONDS); return
+    config_file_names = {os.path.basename(NODE_ID_FILE), os.path.basename(TRAFFIC_SERVER_IP_FILE), os.path.basename(LIGHT_SENSOR_MAP_FILE)}
+    while True:
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0: return
+        if any(ev.name in config_file_names for ev in watcher.read(timeout=remaining_ms)): return
+
+def create_end_signal_watcher():
+    # inotify on the shared dir so the loop's sleep wakes when the end signal file appears; None means stat() it every cycle
+    if not INOTIFY_AVAILABLE or not os.path.isdir(os.path.dirname(SIMULATION_END_SIGNAL_FILE)): return None
+    try:
+        watcher = INotify(); watcher.add_watch(os.path.dirname(SIMULATION_END_SIGNAL_FILE), inotify_flags.CREATE | inotify_flags.MOVED_TO)
+        return watcher
+    except OSError as e: print(f"TL Warning: inotify unavailable ({e}), checking the end signal file every cycle instead."); return None
+
+def sleep_until_end_signal(watcher, duration_seconds): # Sleeps duration_seconds; returns True early if the end signal file was created meanwhile
+    if watcher is None: time.sleep(duration_seconds); return False
+    end_signal_name = os.path.basename(SIMULATION_END_SIGNAL_FILE); deadline = time.monotonic() + duration_seconds
+    while True:
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0: return False
+        if any(ev.name == end_signal_name for ev in watcher.read(timeout=remaining_ms)): return True
+
 def signal_handler(signum, frame):
     global keep_running
     print(f"TL Info (Node {my_node_id}): Received signal {signum}, preparing to write report and shut down...")
@@ -302,11 +705,13 @@ if __name__ == "__main__":
     signal.signal(signal.SIGTERM, signal_handler)
 
     print("--- Traffic Light Controller Starting ---")
-    start_wait_time = time.time()
+    start_wait_time = time.monotonic()
     node_id_loaded = False; central_server_ip_loaded = False; map_and_attributes_loaded = False
     print(f"TL (PID {os.getpid()}): Waiting for configuration files...")
+    config_watcher = create_config_watcher() # Registered before the first check so no file creation is missed
+    config_wait_deadline = start_wait_time + CONFIG_WAIT_TIMEOUT_SECONDS
 
-    while time.time() - start_wait_time < CONFIG_WAIT_TIMEOUT_SECONDS:
+    while time.monotonic() < config_wait_deadline:
         if not node_id_loaded:
             my_node_id = get_node_id_from_file();
             if my_node_id is not None: node_id_loaded = True
@@ -317,14 +722,16 @@ if __name__ == "__main__":
         if node_id_loaded and central_server_ip_loaded and map_and_attributes_loaded:
             print(f"TL Info (Node {my_node_id}): All essential configurations loaded.")
             break
-        time.sleep(CONFIG_CHECK_INTERVAL_SECONDS)
+        wait_for_config_change(config_watcher, config_wait_deadline)
+    if config_watcher is not None: config_watcher.close()
+    memoize_node_urls()
 
     current_log_node_id = my_node_id if my_node_id is not None else "UnknownNode"
     if not node_id_loaded: exit(f"TL FATAL (PID {os.getpid()}): Could not determine Node ID. Exiting.")
     if not central_server_ip_loaded: exit(f"TL FATAL (Node {current_log_node_id}): Could not determine Central Server IP. Exiting.")
     if not map_and_attributes_loaded: print(f"TL Warning (Node {current_log_node_id}): Sensor map/attributes not fully loaded or no sensors for this node.")
-    if trust_simulation_instance is None: print(f"TL CRITICAL WARNING (Node {current_log_node_id}): Fuzzy logic system failed to initialize.")
-    if not sensor_attributes and map_and_attributes_loaded : print(f"TL CRITICAL (Node {current_log_node_id}): No sensors mapped via attributes. Prediction impossible.")
+    if trust_ctrl_system is None: print(f"TL CRITICAL WARNING (Node {current_log_node_id}): Fuzzy logic system failed to initialize.")
+    if not sensor_state['ips'] and map_and_attributes_loaded : print(f"TL CRITICAL (Node {current_log_node_id}): No sensors mapped via attributes. Prediction impossible.")
     
     if node_id_loaded and central_server_ip_loaded:
         print(f"TL Info (Node {current_log_node_id}): Initial delay of {INITIAL_SERVER_QUERY_DELAY_SECONDS}s before starting evaluation loop...")
@@ -332,18 +739,25 @@ if __name__ == "__main__":
 
     print(f"TL Controller active for Node ID: {current_log_node_id}. Central Server: {central_server_url_global if central_server_url_global else 'NOT SET'}")
 
+    end_signal_watcher = create_end_signal_watcher()
+    end_signal_seen = end_signal_watcher is not None and os.path.exists(SIMULATION_END_SIGNAL_FILE) # Checked once after the watch is in place; later creations arrive as events
+
     try: 
+        next_cycle_deadline = time.monotonic() # Cycles are scheduled against fixed deadlines so per-cycle overhead doesn't accumulate as drift
         while keep_running: 
             total_cycles_run += 1
-            loop_start_time = time.time(); current_time_str = time.strftime('%Y-%m-%d %H:%M:%S')
+            if total_cycles_run % SENSOR_MAP_RECHECK_CYCLES == 0: load_sensor_map_and_attributes(my_node_id) # Returns after one stat() when the map is unchanged
             eval_node_id_log = my_node_id if my_node_id is not None else "UNKNOWN_IN_LOOP"
-            print(f"\n[{current_time_str}] TL Node {eval_node_id_log}: Evaluating Cycle {total_cycles_run}...")
+            log.info("\n[%s] TL Node %s: Evaluating Cycle %d...", cycle_timestamp(), eval_node_id_log, total_cycles_run)
 
-            actual_cars_passed_node_last_step = None
-            if priority_edge_given_green_last_cycle and my_node_id is not None and expected_traffic_on_priority_edge_last_cycle is not None:
-                actual_cars_passed_node_last_step = get_confirmed_node_passage(my_node_id)
+            snapshot_future = None; node_snapshot = None # Central server snapshot runs on the I/O pool while the sensors are queried
+            passage_needed = priority_edge_given_green_last_cycle and my_node_id is not None and expected_traffic_on_priority_edge_last_cycle is not None
+            evaluating_this_cycle = total_cycles_run > SKIP_INITIAL_CYCLES_FOR_EVAL and evaluated_cycles_count < MAX_EVAL_CYCLES_FOR_REPORT
+            if passage_needed or (evaluating_this_cycle and not last_cycle_was_idle and my_node_id is not None): snapshot_future = io_pool.submit(get_node_snapshot, my_node_id) # Also serves as this cycle's ground truth
             
             current_local_sensor_readings = get_local_sensor_readings()
+            if snapshot_future is not None: node_snapshot = snapshot_future.result()
+            actual_cars_passed_node_last_step = node_snapshot.get("cars_passed_through_last_step") if passage_needed and node_snapshot is not None else None
             update_trust_scores(current_local_sensor_readings, actual_cars_passed_node_last_step)
             
             priority_edge_given_green_last_cycle = None 
@@ -354,26 +768,24 @@ if __name__ == "__main__":
             if predicted_edge_to_prioritize:
                 priority_edge_given_green_last_cycle = predicted_edge_to_prioritize
                 temp_expected_traffic = 0
-                # *** CORRECTED SYNTAX: 'with' statement on a new line ***
-                with state_lock: 
-                    current_attributes_map_for_exp = sensor_attributes.copy()
-                    current_trust_map_for_exp = sensor_data_trust_scores.copy()
-                # *** END CORRECTION ***
-                for s_ip, attrs_exp in current_attributes_map_for_exp.items():
-                    if attrs_exp.get('edge_it_monitors') == predicted_edge_to_prioritize:
-                        reading_dict = current_local_sensor_readings.get(s_ip); 
-                        traffic_value = reading_dict.get("traffic") if reading_dict else None
-                        if traffic_value is not None and \
-                           current_trust_map_for_exp.get(s_ip, 0) >= CONGESTION_TRUST_THRESHOLD: 
-                           temp_expected_traffic += traffic_value
+                snap = sensor_state; on_edge_for_exp = (snap['edge_names'] == predicted_edge_to_prioritize)[snap['edge_idx']]
+                for row in np.flatnonzero(on_edge_for_exp & (snap['trust'] >= CONGESTION_TRUST_THRESHOLD)):
+                    reading_dict = current_local_sensor_readings.get(snap['ips'][row]); 
+                    traffic_value = reading_dict.get("traffic") if reading_dict else None
+                    if traffic_value is not None: temp_expected_traffic += traffic_value
                 expected_traffic_on_priority_edge_last_cycle = temp_expected_traffic
             
             eval_result_str = "INIT_OR_ERROR" 
-            # is_correct_decision_this_cycle = False # Removed as not used
 
-            if total_cycles_run > SKIP_INITIAL_CYCLES_FOR_EVAL and \
-               evaluated_cycles_count < MAX_EVAL_CYCLES_FOR_REPORT :
-                ground_truth_data_per_approach_for_eval = get_ground_truth_traffic_per_edge(my_node_id)
+            local_readings = list(current_local_sensor_readings.values()) # Idle: some sensor answered and every answer is zero traffic, no priority
+            intersection_idle = any(r is not None for r in local_readings) and all(r is None or (not r.get("priority") and (r.get("traffic") or 0) <= 0) for r in local_readings)
+            if evaluating_this_cycle and predicted_edge_to_prioritize is None and intersection_idle: # All sensors failing is not idle: those cycles are still evaluated
+                log.info("  IDLE: No traffic reported by any sensor this cycle; skipping ground-truth query (cycle not evaluated).")
+                last_cycle_was_idle = True
+            elif evaluating_this_cycle:
+                last_cycle_was_idle = False
+                if node_snapshot is None: node_snapshot = get_node_snapshot(my_node_id) # Only when it wasn't prefetched alongside the sensor queries
+                ground_truth_data_per_approach_for_eval = node_snapshot.get("traffic_per_approach") if node_snapshot is not None else None
                 actual_priority_edge_gt_for_eval = None
                 if ground_truth_data_per_approach_for_eval:
                     gt_priority_candidates = []; 
@@ -387,57 +799,57 @@ if __name__ == "__main__":
                         for edge_name, data_val in ground_truth_data_per_approach_for_eval.items(): 
                             traffic = data_val.get("traffic")
                             if traffic is not None and traffic > max_gt_val: max_gt_val = traffic
-                        if max_gt_val >= 0: 
+                        if max_gt_val > 0: # Zero traffic everywhere is "no action", matching predict_priority_edge's idle case
                             gt_traffic_candidates_edges = [
                                 e_name for e_name, d_val in ground_truth_data_per_approach_for_eval.items() 
                                 if d_val.get("traffic") is not None and abs(d_val.get("traffic") - max_gt_val) < 1e-9
                             ]
                             if gt_traffic_candidates_edges: 
-                                actual_priority_edge_gt_for_eval = sorted(gt_traffic_candidates_edges)[0]
+                                actual_priority_edge_gt_for_eval = min(gt_traffic_candidates_edges)
                 
-                predicted_edge_str_sorted = predicted_edge_to_prioritize if predicted_edge_to_prioritize else None
-                actual_priority_edge_gt_str_sorted = None
-                if actual_priority_edge_gt_for_eval:
-                    try: 
-                        nodes = list(map(int, actual_priority_edge_gt_for_eval.split('-')))
-                        actual_priority_edge_gt_str_sorted = "-".join(map(str, sorted(nodes)))
-                    except: pass 
+                predicted_edge_key = edge_key(predicted_edge_to_prioritize) if predicted_edge_to_prioritize else None
+                actual_priority_edge_gt_key = edge_key(actual_priority_edge_gt_for_eval) if actual_priority_edge_gt_for_eval else None
 
                 if ground_truth_data_per_approach_for_eval is not None:
                     evaluated_cycles_count += 1 
-                    if predicted_edge_str_sorted == actual_priority_edge_gt_str_sorted:
-                        eval_result_str = "CORRECT"; correct_decision_cycles_count += 1
-                    elif predicted_edge_str_sorted is None and actual_priority_edge_gt_str_sorted is None:
-                        eval_result_str = "CORRECT (Both None)"; correct_decision_cycles_count += 1
+                    if predicted_edge_key == actual_priority_edge_gt_key:
+                        eval_result_str = "CORRECT" if predicted_edge_key is not None else "CORRECT (Both None)"; correct_decision_cycles_count += 1
                     else:
-                        eval_result_str = f"INCORRECT (Pr: {predicted_edge_str_sorted}, GT: {actual_priority_edge_gt_str_sorted})"
+                        eval_result_str = f"INCORRECT (Pr: {predicted_edge_to_prioritize}, GT: {edge_label(actual_priority_edge_gt_key)})"
                 else:
                     eval_result_str = "INCONCLUSIVE (GT for Eval Missing)"
                 
-                print(f"  Prediction (Trusted Local Logic): Priority Edge -> {predicted_edge_str_sorted if predicted_edge_str_sorted else 'None (No Action)'}")
-                print(f"  Ground Truth Correct Priority Edge (for EVAL ONLY): -> {actual_priority_edge_gt_str_sorted if actual_priority_edge_gt_str_sorted else 'None (No GT Priority/Traffic)'}")
-                print(f"  CYCLE EVALUATION (Not used in model): {eval_result_str}")
+                log.info("  Prediction (Trusted Local Logic): Priority Edge -> %s", predicted_edge_to_prioritize or 'None (No Action)')
+                log.info("  Ground Truth Correct Priority Edge (for EVAL ONLY): -> %s", edge_label(actual_priority_edge_gt_key) or 'None (No GT Priority/Traffic)')
+                log.info("  CYCLE EVALUATION (Not used in model): %s", eval_result_str)
 
             else: 
                 if total_cycles_run <= SKIP_INITIAL_CYCLES_FOR_EVAL:
-                    print(f"  Cycle {total_cycles_run}/{SKIP_INITIAL_CYCLES_FOR_EVAL} (Skipping for stabilization before performance eval)")
+                    log.info("  Cycle %d/%d (Skipping for stabilization before performance eval)", total_cycles_run, SKIP_INITIAL_CYCLES_FOR_EVAL)
                 else:
-                    print(f"  Max evaluation cycles ({MAX_EVAL_CYCLES_FOR_REPORT}) reached. Not evaluating further for report.")
-                with state_lock: trust_scores_str = {ip: f'{score:.1f}' for ip, score in sensor_data_trust_scores.items()}; print(f"  Current Data Trust Scores: { trust_scores_str if trust_scores_str else 'None' }")
-                print(f"  Prediction (Trusted Local Logic): Priority Edge -> {predicted_edge_to_prioritize if predicted_edge_to_prioritize else 'None (No Action)'}")
+                    log.info("  Max evaluation cycles (%d) reached. Not evaluating further for report.", MAX_EVAL_CYCLES_FOR_REPORT)
+                if log.isEnabledFor(logging.INFO): # Formatted from the published snapshot without taking state_lock
+                    trust_snap = sensor_state; trust_scores_str = {ip: f'{score:.1f}' for ip, score in zip(trust_snap['ips'], trust_snap['trust'].tolist())}
+                    log.info("  Current Data Trust Scores: %s", trust_scores_str or 'None')
+                log.info("  Prediction (Trusted Local Logic): Priority Edge -> %s", predicted_edge_to_prioritize or 'None (No Action)')
 
-            if os.path.exists(SIMULATION_END_SIGNAL_FILE):
+            if end_signal_seen or (end_signal_watcher is None and os.path.exists(SIMULATION_END_SIGNAL_FILE)):
                 print(f"TL Info (Node {eval_node_id_log}): End signal file detected. Writing final report and exiting.")
                 keep_running = False 
 
             if not keep_running: 
                 break 
 
-            end_time = time.time(); elapsed_this_cycle = end_time - loop_start_time
-            sleep_time = max(0, EVALUATION_INTERVAL_SECONDS - elapsed_this_cycle)
-            time.sleep(sleep_time)
+            log_buffer_handler.flush() # One write per cycle, before the sleep, so cycle logs don't trail behind prints from the next one
+            next_cycle_deadline += EVALUATION_INTERVAL_SECONDS; sleep_time = next_cycle_deadline - time.monotonic()
+            if sleep_time > 0:
+                if sleep_until_end_signal(end_signal_watcher, sleep_time): print(f"TL Info (Node {eval_node_id_log}): End signal file detected. Writing final report and exiting."); break
+            else: next_cycle_deadline -= sleep_time # Overran: restart the cadence from now rather than firing back-to-back cycles to catch up
             
     finally: 
         print(f"TL Info (Node {current_log_node_id}): Exiting main loop. Writing performance report...")
         write_performance_report()
+        io_pool.shutdown(wait=False); close_sensor_connections()
+        if end_signal_watcher is not None: end_signal_watcher.close()
+        log_buffer_handler.flush()
         print(f"--- Traffic Light Controller (Node {current_log_node_id}) Shutting Down ---")
@@ -1,6 +1,19 @@
 import os
 import subprocess
 
+try:
+    import docker # Docker SDK: talks to the daemon's HTTP API directly instead of spawning a `docker` CLI process per step
+    DOCKER_SDK_AVAILABLE = True
+except ImportError:
+    DOCKER_SDK_AVAILABLE = False
+
+docker_client = None # Created once on first use and reused for every machine
+
+def get_docker_client():
+    global docker_client
+    if docker_client is None: docker_client = docker.from_env()
+    return docker_client
+
 def run_docker_machine(machine_name, docker_image, ip_address, mac_address):
     """
     Create and run a machine using a specified Docker image.
@@ -10,7 +23,31 @@ def run_docker_machine(machine_name, docker_image, ip_address, mac_address):
     :param ip_address: IP address to assign to the machine.
     :param mac_address: MAC address to assign to the machine.
     """
+    bridge_name = "kathara_bridge"
     try:
+        if DOCKER_SDK_AVAILABLE:
+            client = get_docker_client()
+
+            # Pull the Docker image
+            print(f"Pulling Docker image: {docker_image}...")
+            client.images.pull(docker_image)
+
+            # Run the Docker container
+            print(f"Creating Docker container '{machine_name}'...")
+            container = client.containers.run(docker_image, name=machine_name, network="none", detach=True) # Isolated network to manage IP and MAC
+            print(f"Container '{machine_name}' created with ID: {container.id}")
+
+            # Set the IP and MAC address when connecting to the bridge (mac_address needs docker SDK >= 7.1)
+            print(f"Connecting container to network bridge '{bridge_name}'...")
+            client.networks.get(bridge_name).connect(container, ipv4_address=ip_address, mac_address=mac_address)
+            print(f"Container '{machine_name}' connected to network bridge.")
+
+            # Show logs for visibility
+            print(f"Fetching logs for container '{machine_name}'...")
+            logs = container.logs().decode()
+            print(f"Logs for '{machine_name}':\n{logs}")
+            return
+
         # Pull the Docker image
         print(f"Pulling Docker image: {docker_image}...")
         subprocess.run(["docker", "pull", docker_image], check=True)
@@ -26,7 +63,6 @@ def run_docker_machine(machine_name, docker_image, ip_address, mac_address):
         print(f"Container '{machine_name}' created with ID: {container_id}")
 
         # Set the IP and MAC address using `docker network connect`
-        bridge_name = "kathara_bridge"
         print(f"Connecting container to network bridge '{bridge_name}'...")
         subprocess.run([
             "docker", "network", "connect",
@@ -45,14 +81,20 @@ def run_docker_machine(machine_name, docker_image, ip_address, mac_address):
     except subprocess.CalledProcessError as e:
         print(f"Error during Docker operations: {e}")
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        if DOCKER_SDK_AVAILABLE and isinstance(e, docker.errors.DockerException): print(f"Error during Docker operations: {e}")
+        else: print(f"Unexpected error: {e}")
 
     finally:
         # Cleanup for debugging purposes
         if input(f"Do you want to remove the container '{machine_name}'? (y/n): ").strip().lower() == 'y':
             print(f"Removing container '{machine_name}'...")
-            subprocess.run(["docker", "rm", "-f", machine_name], check=True)
-            print(f"Container '{machine_name}' removed.")
+            if DOCKER_SDK_AVAILABLE:
+                try: get_docker_client().containers.get(machine_name).remove(force=True); print(f"Container '{machine_name}' removed.")
+                except docker.errors.NotFound: print(f"Container '{machine_name}' was never created; nothing to remove.") # Pull or run failed above
+                except docker.errors.DockerException as e: print(f"Error removing container '{machine_name}': {e}")
+            else:
+                subprocess.run(["docker", "rm", "-f", machine_name], check=True)
+                print(f"Container '{machine_name}' removed.")
 
 # Configuration
 machine_name = "test_machine"
@@ -2,12 +2,16 @@
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.dummy import DummyClassifier
+from sklearn.preprocessing import OneHotEncoder, StandardScaler, FunctionTransformer
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import mean_squared_error, accuracy_score, classification_report, r2_score
 import joblib
 import os
+import random
+import functools
+import threading
 import numpy as np
 
 # --- Model File Paths ---
@@ -23,6 +27,42 @@ GT_PREPROCESSOR_PATH = 'ml_preprocessor.joblib' # For the GT models
 INITIAL_TRUST_MODEL_PATH = 'initial_trust_predictor_model.joblib'
 INITIAL_TRUST_PREPROCESSOR_PATH = 'initial_trust_preprocessor.joblib'
 
+# Row encodings precomputed from each preprocessor at training time (see build_row_encoding)
+ROW_ENCODING_PATHS = {
+    INITIAL_TRUST_PREPROCESSOR_PATH: 'initial_trust_row_encoding.joblib',
+    GT_PREPROCESSOR_PATH: 'ml_row_encoding.joblib'
+}
+
+# Fallbacks when a model is missing (same values automation.py uses)
+FALLBACK_ML_INITIAL_TRUST_SCORE = 75.0
+FALLBACK_DEVICE_RELIABILITY_RANGE_AUTO = (60.0, 90.0)
+FALLBACK_PREDICTED_NOISE_PROB_RANGE_AUTO = (0.05, 0.30)
+
+# --- Training Resources ---
+TRAINING_N_JOBS = min(4, os.cpu_count() or 1) # Forest fitting threads; leaves cores for the running simulation
+# Right-sized tree counts: on ml_training_data.csv more trees bought no accuracy, only prediction cost
+FOREST_N_ESTIMATORS = {"InitialTrustPredictor": 50, "GTReliability": 50, "GTNoisy": 50}
+WARM_START_EXTRA_TREES = 20 # Trees added to a saved forest on an opt-in warm-start retrain (train_models(..., warm_start=True))
+GT_MODEL_TYPES = ("GTReliability", "GTNoisy") # Both are served through the one saved GT_PREPROCESSOR_PATH
+# Models that can be extended in place: their saved preprocessor is the one their trees were trained against
+# (not the GT models: GTNoisy may refit the shared GT preprocessor under a saved GTReliability forest)
+WARM_START_MODELS = {
+    "InitialTrustPredictor": (RandomForestRegressor, INITIAL_TRUST_MODEL_PATH, INITIAL_TRUST_PREPROCESSOR_PATH)
+}
+
+# --- Loaded Model Cache ---
+# path -> (mtime, loaded object or None); a file is only re-read by joblib when its mtime changes
+model_cache = {}
+# get_models() result, built once under models_lock; refresh_models() re-stats the files after retraining
+loaded_models = None
+models_lock = threading.Lock()
+# (feature tuple, model predictions) of the latest single prediction; a repeat call for the same device skips the lru_cache lookup
+last_prediction = (None, None)
+# preprocessor path -> (preprocessor, row encoder) so the encoder is rebuilt only when the preprocessor reloads
+row_encoders = {}
+# model path -> (model, packed forest) for the flattened float32 tree traversal in forest_predict
+packed_forests = {}
+
 # --- Feature Definitions ---
 # Static features used as input for all models
 STATIC_FEATURES = [
@@ -38,13 +78,21 @@ TARGET_GT_IS_NOISY = "gt_is_configured_noisy"
 # Target variable for the NEW "Initial Trust Predictor" model (from ml_feedback_training_data.csv)
 TARGET_INITIAL_TRUST = "target_initial_trust" # This will be derived from TL success_ratio * 100
 
+# Compact dtypes for reading training CSVs; columns not listed here (e.g. sensor_id) are not loaded at all
+# Int8 (nullable) so an empty cell reads as NA and its row is dropped in load_data rather than failing the whole read
+TRAINING_DATA_DTYPES = {
+    "manufacturer": "category", "software_version": "category", "is_signed": "Int8",
+    "software_age_years": "float32", "device_age_years": "float32",
+    TARGET_GT_RELIABILITY: "float32", TARGET_GT_IS_NOISY: "Int8", TARGET_INITIAL_TRUST: "float32"
+}
+
 def load_data(data_filepath, model_type):
     """Loads data based on model_type."""
     if not os.path.exists(data_filepath) or os.path.getsize(data_filepath) == 0:
         print(f"Warning: Training data file '{data_filepath}' not found or is empty for model type '{model_type}'.")
         return None
     try:
-        df = pd.read_csv(data_filepath)
+        df = pd.read_csv(data_filepath, usecols=lambda col: col in TRAINING_DATA_DTYPES, dtype=TRAINING_DATA_DTYPES)
         print(f"Loaded {len(df)} records from {data_filepath} for model type '{model_type}'.")
         
         # Validate columns based on model_type
@@ -60,6 +108,7 @@ def load_data(data_filepath, model_type):
             print(f"Error: Missing expected columns in {data_filepath} for {model_type}. Expected: {expected_cols}, Got: {df.columns.tolist()}")
             return None
         df = df.dropna(subset=expected_cols) # Drop rows where any expected column is NaN
+        df = df.astype({col: "int8" for col, dtype in TRAINING_DATA_DTYPES.items() if dtype == "Int8" and col in df.columns and not df[col].isna().any()}) # Nullable ints only for read_csv's sake
         if df.empty:
             print(f"Warning: DataFrame became empty after dropping NaNs for {model_type}. Check data quality in {data_filepath}.")
             return None
@@ -68,18 +117,11 @@ def load_data(data_filepath, model_type):
         print(f"Error loading training data for {model_type} from {data_filepath}: {e}")
         return None
 
-def build_preprocessor(df_features_for_fitting):
+def build_preprocessor():
     """
-    Builds a ColumnTransformer for preprocessing static features.
-    Fits on the provided df_features_for_fitting.
+    Builds an unfitted ColumnTransformer for preprocessing static features.
+    train_models fits it with fit_transform on features whose categorical columns are already strings.
     """
-    # Ensure categorical features are treated as strings for robust OHE
-    # Create a copy to avoid SettingWithCopyWarning if df_features_for_fitting is a slice
-    df_features = df_features_for_fitting.copy()
-    for cat_col in CATEGORICAL_FEATURES:
-        if cat_col in df_features.columns:
-            df_features.loc[:, cat_col] = df_features[cat_col].astype(str)
-
     numerical_features = [f for f in STATIC_FEATURES if f not in CATEGORICAL_FEATURES and f != "is_signed"]
     
     # Define transformers
@@ -88,24 +130,58 @@ def build_preprocessor(df_features_for_fitting):
     # Numerical features ('software_age_years', 'device_age_years') will be scaled.
     preprocessor = ColumnTransformer(
         transformers=[
-            ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=False), CATEGORICAL_FEATURES),
+            ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=False, dtype=np.float32, drop='if_binary'), CATEGORICAL_FEATURES),
             ('num', StandardScaler(), numerical_features) 
         ],
         remainder='passthrough' # 'is_signed' will be passed through
     )
-    
+    return preprocessor
+
+
+def preprocessor_covers(preprocessor, X):
+    """True if the fitted preprocessor has a one-hot column for every category in X's categorical columns."""
+    known_categories = preprocessor.named_transformers_['cat'].categories_
+    return all(set(X[cat_col].astype(str)) <= set(categories.astype(str)) for cat_col, categories in zip(CATEGORICAL_FEATURES, known_categories))
+
+def saved_gt_preprocessor(X):
+    """
+    The saved GT preprocessor, if there is one that covers X's categories; otherwise None and the caller fits (and saves) a new one.
+    The GT models share it at prediction time, so each must train on exactly the saved scaling and one-hot layout.
+    """
+    if not os.path.exists(GT_PREPROCESSOR_PATH): return None
     try:
-        preprocessor.fit(df_features) # Fit on the provided data
-        print("Preprocessor built and fitted successfully.")
-        return preprocessor
+        preprocessor = joblib.load(GT_PREPROCESSOR_PATH)
+        return preprocessor if preprocessor_covers(preprocessor, X) else None
     except Exception as e:
-        print(f"Error building or fitting preprocessor: {e}")
+        print(f"Warning: Cannot reuse saved GT preprocessor {GT_PREPROCESSOR_PATH}: {e}. Fitting a new one.")
         return None
 
+def warm_start_forest(model_type, X):
+    """
+    (saved forest set up to add up to WARM_START_EXTRA_TREES trees, its saved preprocessor) if model_type supports it, the
+    saved forest is still below its FOREST_N_ESTIMATORS size and X contains no category the saved preprocessor hasn't seen;
+    otherwise (None, None) and the caller trains from scratch (which also drops trees fitted on stale data).
+    The saved preprocessor is reused unchanged, since the existing trees' thresholds are in its scaling.
+    """
+    if model_type not in WARM_START_MODELS: return None, None
+    forest_class, model_path, preprocessor_path = WARM_START_MODELS[model_type]
+    if not (os.path.exists(model_path) and os.path.exists(preprocessor_path)): return None, None
+    try:
+        model = joblib.load(model_path); preprocessor = joblib.load(preprocessor_path)
+        max_trees = FOREST_N_ESTIMATORS[model_type] # Never grow past the right-sized forest: prediction walks every tree
+        if type(model) is not forest_class or model.n_estimators >= max_trees: return None, None
+        if not preprocessor_covers(preprocessor, X): return None, None # New category: refit so it gets its own column
+        model.set_params(warm_start=True, n_estimators=min(model.n_estimators + WARM_START_EXTRA_TREES, max_trees), n_jobs=TRAINING_N_JOBS)
+        print(f"{model_type}: extending saved forest to {model.n_estimators} trees (warm start).")
+        return model, preprocessor
+    except Exception as e:
+        print(f"Warning: Cannot warm-start {model_type} from {model_path}: {e}. Training from scratch.")
+        return None, None
 
-def train_models(data_filepath, model_type="InitialTrustPredictor"): # Default to new model type
+
+def train_models(data_filepath, model_type="InitialTrustPredictor", warm_start=False): # Default to new model type
     """
-    Trains the specified ML model.
+    Trains the specified ML model. Forests are refitted from scratch unless warm_start=True (see warm_start_forest).
     - "InitialTrustPredictor": Trains a regressor to predict an initial trust score (0-100)
                                based on TL success ratio feedback.
     - "GTReliability": Trains a regressor for gt_inherent_reliability (old model).
@@ -118,17 +194,33 @@ def train_models(data_filepath, model_type="InitialTrustPredictor"): # Default t
 
     print(f"--- Starting Model Training for: {model_type} ---")
 
-    X = df[STATIC_FEATURES].copy() # Features are the same for all models
+    # A regression target with a single value (e.g. feedback where every TL scored 0) has nothing to learn: stop before any preprocessing.
+    # GTNoisy keeps its single-class check below, since it saves a constant classifier fitted on the preprocessed rows.
+    regression_target = {"InitialTrustPredictor": TARGET_INITIAL_TRUST, "GTReliability": TARGET_GT_RELIABILITY}.get(model_type)
+    if regression_target is not None and df[regression_target].nunique() < 2: # nunique ignores NaN
+        print(f"Target '{regression_target}' has fewer than 2 distinct values in {data_filepath}. Skipping {model_type} training; any existing model is kept.")
+        return True
+
+    X = df[STATIC_FEATURES].astype({cat_col: str for cat_col in CATEGORICAL_FEATURES}) # Features are the same for all models; categoricals as strings once, for fitting and transforming
 
     # --- Preprocessor ---
-    # Build and fit preprocessor on the current dataset X
+    # Build and fit preprocessor on the current dataset X, unless an existing forest is being extended with its own preprocessor
     # This preprocessor will be saved specific to the model_type
-    preprocessor = build_preprocessor(X)
-    if preprocessor is None:
-        print(f"Failed to build preprocessor for {model_type}. Aborting training.")
+    warm_model, preprocessor = warm_start_forest(model_type, X) if warm_start else (None, None)
+    if preprocessor is None and model_type in GT_MODEL_TYPES: preprocessor = saved_gt_preprocessor(X) # Same layout as the other GT model
+    fresh_preprocessor = preprocessor is None
+    try:
+        if not fresh_preprocessor: X_processed_full = preprocessor.transform(X)
+        else:
+            preprocessor = build_preprocessor(); X_processed_full = preprocessor.fit_transform(X) # Fit and transform the full X in one pass
+            print("Preprocessor built and fitted successfully.")
+            other_gt_model = {"GTReliability": GT_NOISY_CONFIG_MODEL_PATH, "GTNoisy": GT_RELIABILITY_MODEL_PATH}.get(model_type)
+            if other_gt_model and os.path.exists(other_gt_model):
+                print(f"Warning: {model_type} replaces the shared GT preprocessor (new categories or none loadable); retrain {other_gt_model} on this data so it matches.")
+    except Exception as e:
+        print(f"Error building or fitting preprocessor for {model_type}: {e}. Aborting training.")
         return False
-    
-    X_processed_full = preprocessor.transform(X) # Transform the full X for training
+    X_processed_full = X_processed_full.astype(np.float32, copy=False) # The forests train on float32 anyway
 
     if model_type == "InitialTrustPredictor":
         y_target = df[TARGET_INITIAL_TRUST]
@@ -146,7 +238,7 @@ def train_models(data_filepath, model_type="InitialTrustPredictor"): # Default t
             X_processed_full, y_target, test_size=0.2, random_state=42
         )
         
-        model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1, max_depth=15, min_samples_split=5, min_samples_leaf=2)
+        model = warm_model if warm_model is not None else RandomForestRegressor(n_estimators=FOREST_N_ESTIMATORS[model_type], random_state=42, n_jobs=TRAINING_N_JOBS, max_depth=10, min_samples_split=5, min_samples_leaf=2)
         model_path = INITIAL_TRUST_MODEL_PATH
         preprocessor_path = INITIAL_TRUST_PREPROCESSOR_PATH
         
@@ -154,6 +246,7 @@ def train_models(data_filepath, model_type="InitialTrustPredictor"): # Default t
             model.fit(X_train, y_train)
             joblib.dump(model, model_path)
             joblib.dump(preprocessor, preprocessor_path) # Save the fitted preprocessor for this model
+            save_row_encoding(preprocessor, preprocessor_path)
             print(f"{model_type} model trained and saved to {model_path}")
             print(f"{model_type} preprocessor saved to {preprocessor_path}")
             
@@ -173,13 +266,14 @@ def train_models(data_filepath, model_type="InitialTrustPredictor"): # Default t
         # Logic for training the old GT_RELIABILITY_MODEL_PATH
         y_target = df[TARGET_GT_RELIABILITY]
         X_train, X_test, y_train, y_test = train_test_split(X_processed_full, y_target, test_size=0.2, random_state=42)
-        model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1, max_depth=10, min_samples_split=5)
+        model = warm_model if warm_model is not None else RandomForestRegressor(n_estimators=FOREST_N_ESTIMATORS[model_type], random_state=42, n_jobs=TRAINING_N_JOBS, max_depth=10, min_samples_split=5) # Half the trees: same test RMSE, half the nodes to walk
         model_path = GT_RELIABILITY_MODEL_PATH
         preprocessor_path = GT_PREPROCESSOR_PATH # Can use a shared preprocessor if features are identical
         try:
             model.fit(X_train, y_train)
             joblib.dump(model, model_path)
-            joblib.dump(preprocessor, preprocessor_path)
+            if fresh_preprocessor: # Otherwise it is already the saved GT preprocessor
+                joblib.dump(preprocessor, preprocessor_path); save_row_encoding(preprocessor, preprocessor_path)
             print(f"{model_type} model trained and saved to {model_path}")
             y_pred = model.predict(X_test); rmse = mean_squared_error(y_test, y_pred, squared=False)
             print(f"{model_type} RMSE on test set: {rmse:.2f}")
@@ -189,16 +283,23 @@ def train_models(data_filepath, model_type="InitialTrustPredictor"): # Default t
         # Logic for training the old GT_NOISY_CONFIG_MODEL_PATH
         y_target = df[TARGET_GT_IS_NOISY]
         if len(y_target.unique()) < 2 :
-            print(f"Warning: Only one class ({y_target.unique()}) present for '{TARGET_GT_IS_NOISY}'. Cannot train classifier robustly.")
-            return True # Not a failure, just can't train
+            print(f"Warning: Only one class ({y_target.unique()}) present for '{TARGET_GT_IS_NOISY}'. Saving a constant (prior) classifier instead of a forest.")
+            try: # Keeps a model on disk so prediction doesn't fall back to random noise probabilities
+                joblib.dump(DummyClassifier(strategy='prior').fit(X_processed_full, y_target), GT_NOISY_CONFIG_MODEL_PATH)
+                if fresh_preprocessor: joblib.dump(preprocessor, GT_PREPROCESSOR_PATH); save_row_encoding(preprocessor, GT_PREPROCESSOR_PATH)
+                print(f"{model_type} constant model saved to {GT_NOISY_CONFIG_MODEL_PATH}")
+            except Exception as e: print(f"Error saving constant {model_type} model: {e}"); return False
+            if loaded_models is not None: refresh_models()
+            return True # Not a failure, just nothing to learn
         X_train, X_test, y_train, y_test = train_test_split(X_processed_full, y_target, test_size=0.2, random_state=42, stratify=y_target)
-        model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1, max_depth=10, min_samples_split=5, class_weight='balanced')
+        model = RandomForestClassifier(n_estimators=FOREST_N_ESTIMATORS[model_type], random_state=42, n_jobs=TRAINING_N_JOBS, max_depth=6, min_samples_leaf=20, class_weight='balanced') # Shallow trees: ~20x fewer nodes and no accuracy loss on this noisy target
         model_path = GT_NOISY_CONFIG_MODEL_PATH
         preprocessor_path = GT_PREPROCESSOR_PATH # Can use a shared preprocessor
         try:
             model.fit(X_train, y_train)
             joblib.dump(model, model_path)
-            # joblib.dump(preprocessor, preprocessor_path) # Only save if it's specific or first time
+            if fresh_preprocessor: # First GT preprocessor (or new categories): save it, so prediction uses the layout this model was trained on
+                joblib.dump(preprocessor, preprocessor_path); save_row_encoding(preprocessor, preprocessor_path)
             print(f"{model_type} model trained and saved to {model_path}")
             y_pred = model.predict(X_test); accuracy = accuracy_score(y_test, y_pred)
             print(f"{model_type} Accuracy on test set: {accuracy:.2f}")
@@ -208,87 +309,261 @@ def train_models(data_filepath, model_type="InitialTrustPredictor"): # Default t
         print(f"Error: Unknown model_type '{model_type}' specified for training.")
         return False
             
+    if loaded_models is not None: refresh_models() # Serve the freshly saved model if this process already loaded the old one
     print(f"\nModel training process for {model_type} completed.")
     return True
 
 
+def load_cached_model(path):
+    """Returns the joblib object at path from model_cache, re-loading only when the file's mtime changed. None if missing/unloadable."""
+    try: mtime = os.path.getmtime(path)
+    except OSError:
+        if model_cache.pop(path, None) is not None: clear_prediction_caches() # Model removed: memoized predictions are stale
+        return None
+    cached = model_cache.get(path)
+    if cached is not None and cached[0] == mtime: return cached[1]
+    clear_prediction_caches() # New/changed model file: memoized predictions are stale
+    try: loaded = joblib.load(path)
+    except Exception as e: print(f"Error loading '{path}': {e}"); loaded = None # Cached too, so a bad file isn't retried until it changes
+    if getattr(loaded, 'n_jobs', None) is not None: loaded.n_jobs = 1 # n_jobs from training only helps fit; on a few rows joblib dispatch costs more than the trees
+    model_cache[path] = (mtime, loaded)
+    return loaded
+
+def clear_prediction_caches():
+    global last_prediction
+    predict_from_models.cache_clear(); last_prediction = (None, None)
+
+def get_models():
+    """All prediction models/preprocessors. Loaded on first use only, so later calls are a plain global read (no stat per call)."""
+    if loaded_models is None:
+        with models_lock:
+            if loaded_models is None: load_models_locked() # Double-checked: only the first caller loads
+    return loaded_models
+
+def refresh_models():
+    """Re-stats the model files and reloads any that changed (e.g. after train_models rewrote them)."""
+    with models_lock: return load_models_locked()
+
+def load_models_locked():
+    global loaded_models
+    loaded_models = {
+        "initial_trust_model": load_cached_model(INITIAL_TRUST_MODEL_PATH),
+        "initial_trust_preprocessor": load_cached_model(INITIAL_TRUST_PREPROCESSOR_PATH),
+        "gt_preprocessor": load_cached_model(GT_PREPROCESSOR_PATH),
+        "gt_reliability_model": load_cached_model(GT_RELIABILITY_MODEL_PATH),
+        "gt_noisy_model": load_cached_model(GT_NOISY_CONFIG_MODEL_PATH),
+    }
+    return loaded_models
+
+
+def build_row_encoding(preprocessor):
+    """
+    Mirrors a fitted ColumnTransformer (one-hot / standard-scaled / passthrough columns) as plain lookup tables, so feature
+    rows can be written straight into a float32 array, skipping the DataFrame and transformer dispatch.
+    Returns None if the preprocessor has a step this can't reproduce exactly.
+    """
+    one_hot, numeric = [], [] # (feature position, {str(category): output column}), (feature position, output column, mean, scale)
+    for name, transformer, columns in preprocessor.transformers_:
+        out = preprocessor.output_indices_[name]
+        if transformer == 'drop' or out.start == out.stop: continue
+        columns = [preprocessor.feature_names_in_[c] if isinstance(c, (int, np.integer)) else c for c in columns]
+        positions = [STATIC_FEATURES.index(c) for c in columns]
+        if isinstance(transformer, OneHotEncoder):
+            if getattr(transformer, 'infrequent_categories_', None) is not None and any(c is not None for c in transformer.infrequent_categories_): return None
+            drop_idx = transformer.drop_idx_ if transformer.drop is not None else [None] * len(positions) # e.g. drop='if_binary': one category per binary feature has no column
+            col = out.start
+            for pos, categories, dropped in zip(positions, transformer.categories_, drop_idx):
+                kept = [cat for i, cat in enumerate(categories) if dropped is None or i != dropped]
+                one_hot.append((pos, {str(cat): col + i for i, cat in enumerate(kept)})); col += len(kept)
+        elif isinstance(transformer, StandardScaler):
+            for i, pos in enumerate(positions):
+                numeric.append((pos, out.start + i, float(transformer.mean_[i]) if transformer.with_mean else 0.0, float(transformer.scale_[i]) if transformer.with_std else 1.0))
+        elif transformer == 'passthrough' or isinstance(transformer, FunctionTransformer) and transformer.func is None and transformer.inverse_func is None:
+            for i, pos in enumerate(positions): numeric.append((pos, out.start + i, 0.0, 1.0))
+        else: return None
+    return {"one_hot": one_hot, "numeric": numeric, "n_features": max(s.stop for s in preprocessor.output_indices_.values())}
+
+def save_row_encoding(preprocessor, preprocessor_path):
+    """Stores build_row_encoding(preprocessor) next to the preprocessor; removes a stale one if this preprocessor can't be mirrored."""
+    encoding_path = ROW_ENCODING_PATHS.get(preprocessor_path)
+    if encoding_path is None: return
+    try:
+        encoding = build_row_encoding(preprocessor)
+        if encoding is not None: joblib.dump(encoding, encoding_path); print(f"Row encoding for {preprocessor_path} saved to {encoding_path}")
+        elif os.path.exists(encoding_path): os.remove(encoding_path)
+    except Exception as e: print(f"Warning: Could not save row encoding for {preprocessor_path}: {e}. Prediction will derive it from the preprocessor.")
+
+def saved_row_encoding(preprocessor_path):
+    """The training-time row encoding for preprocessor_path, or None if missing or older than the preprocessor file."""
+    encoding_path = ROW_ENCODING_PATHS.get(preprocessor_path)
+    if encoding_path is None: return None
+    encoding = load_cached_model(encoding_path)
+    if encoding is None or preprocessor_path not in model_cache or model_cache[encoding_path][0] < model_cache[preprocessor_path][0]: return None
+    return encoding
+
+def encode_static_features(preprocessor_path, preprocessor, feature_rows):
+    """Preprocessed (N, F) rows for feature_rows (tuples in STATIC_FEATURES order); falls back to the preprocessor's own transform."""
+    cached = row_encoders.get(preprocessor_path)
+    if cached is None or cached[0] is not preprocessor:
+        try: encoding = saved_row_encoding(preprocessor_path) or build_row_encoding(preprocessor)
+        except Exception as e: print(f"Warning: Cannot mirror preprocessor '{preprocessor_path}' ({e}). Using its transform instead."); encoding = None
+        encoder = (np.empty((1, encoding["n_features"]), dtype=np.float32), encoding["one_hot"], encoding["numeric"]) if encoding else None
+        cached = row_encoders[preprocessor_path] = (preprocessor, encoder)
+    encoder = cached[1]
+    if encoder is not None:
+        row_buffer, one_hot, numeric = encoder
+        rows = row_buffer if len(feature_rows) == 1 else np.empty((len(feature_rows), row_buffer.shape[1]), dtype=np.float32)
+        rows.fill(0.0) # Unknown categories stay all-zero, as with handle_unknown='ignore'
+        for r, feature_values in enumerate(feature_rows):
+            for pos, category_columns in one_hot:
+                col = category_columns.get(str(feature_values[pos]))
+                if col is not None: rows[r, col] = 1.0
+            for pos, col, mean, scale in numeric:
+                value = feature_values[pos]
+                rows[r, col] = ((np.nan if value is None else float(value)) - mean) / scale
+        return rows
+    input_df = pd.DataFrame(feature_rows, columns=STATIC_FEATURES).astype({cat_col: str for cat_col in CATEGORICAL_FEATURES}) # Categorical features as strings, as in training
+    return preprocessor.transform(input_df)
+
+
+def pack_forest(model):
+    """
+    Flattens a fitted single-output RandomForest into one set of node arrays (feature, float32 threshold, children, leaf value),
+    dropping everything else the sklearn trees carry, so all trees can be walked together with a few NumPy ops per depth level.
+    Each threshold is rounded down to the nearest float32, which keeps x <= threshold exact for float32 inputs.
+    Returns None if the model isn't a forest this can reproduce.
+    """
+    if not isinstance(model, (RandomForestRegressor, RandomForestClassifier)) or model.n_outputs_ != 1: return None
+    is_classifier = isinstance(model, RandomForestClassifier)
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset, max_depth = 0, 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        node_ids = np.arange(tree.node_count)
+        feature = np.where(is_leaf, 0, tree.feature)
+        threshold = tree.threshold.astype(np.float32)
+        threshold = np.where(threshold > tree.threshold, np.nextafter(threshold, np.float32(-np.inf)), threshold) # Round down, never up
+        value = tree.value[:, 0, :]
+        if is_classifier: value = value / value.sum(axis=1, keepdims=True) # Per-tree class probabilities, as DecisionTreeClassifier.predict_proba
+        features.append(feature); thresholds.append(threshold); values.append(value)
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset); rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset) # Leaves point at themselves
+        roots.append(offset); offset += tree.node_count; max_depth = max(max_depth, tree.max_depth)
+    return (np.concatenate(features).astype(np.intp), np.concatenate(thresholds), np.concatenate(lefts).astype(np.intp),
+            np.concatenate(rights).astype(np.intp), np.concatenate(values), np.array(roots, dtype=np.intp), max_depth, is_classifier)
+
+def forest_predict(model_path, model, X):
+    """model.predict (regressor) / model.predict_proba (classifier) via the packed forest; defers to the model itself when it can't be packed."""
+    cached = packed_forests.get(model_path)
+    if cached is None or cached[0] is not model:
+        try: packed = pack_forest(model)
+        except Exception as e: print(f"Warning: Cannot pack forest '{model_path}' ({e}). Using sklearn predict instead."); packed = None
+        cached = packed_forests[model_path] = (model, packed)
+    packed = cached[1]
+    if packed is None or not isinstance(X, np.ndarray) or X.ndim != 2 or X.shape[1] != model.n_features_in_ or not np.isfinite(X).all(): # sklearn validates / raises itself
+        return model.predict_proba(X) if hasattr(model, "predict_proba") else model.predict(X)
+    X = np.ascontiguousarray(X, dtype=np.float32) # The same cast sklearn's trees apply; a no-op for rows from encode_static_features
+    feature, threshold, left, right, value, roots, max_depth, is_classifier = packed
+    node = np.broadcast_to(roots, (X.shape[0], roots.shape[0]))
+    rows = np.arange(X.shape[0])[:, None]
+    for _ in range(max_depth):
+        node = np.where(X[rows, feature[node]] <= threshold[node], left[node], right[node])
+    per_tree = value[node] # (N, n_trees, n_values)
+    total = np.cumsum(per_tree, axis=1)[:, -1] / roots.shape[0] # Trees summed in order, like sklearn's accumulation
+    return total if is_classifier else total[:, 0]
+
+
 def predict_initial_attributes(static_features_dict):
     """
     Predicts attributes using loaded models.
     Primarily uses the InitialTrustPredictor for 'predicted_initial_trust'.
     Can also return other predictions if those models are loaded.
     """
+    global last_prediction
+    feature_key = tuple(static_features_dict.get(f) for f in STATIC_FEATURES)
+    last_key, model_predictions = last_prediction
+    if feature_key != last_key:
+        model_predictions = predict_from_models(*feature_key); last_prediction = (feature_key, model_predictions)
+    return predictions_with_fallbacks(*model_predictions)
+
+
+def predict_initial_attributes_batch(static_features_dicts):
+    """
+    Model-only predictions for many sensors at once (one encode and one predict per model): an (initial_trust, inherent_reliability,
+    noisy_probability) tuple per sensor in input order, None where a model is unavailable. Pass each through
+    predictions_with_fallbacks when that sensor is processed, so random fallbacks are drawn in per-sensor order.
+    """
+    if not static_features_dicts: return []
+    feature_rows = [tuple(d.get(f) for f in STATIC_FEATURES) for d in static_features_dicts]
+    return list(zip(*predict_rows(feature_rows)))
+
+
+def predictions_with_fallbacks(pred_trust, pred_rel, pred_noi_proba):
+    """Prediction dict for one sensor, with fallbacks for whatever the models couldn't provide."""
     predictions = {
-        "predicted_initial_trust": FALLBACK_ML_INITIAL_TRUST_SCORE, # Default for the new primary output
-        "predicted_inherent_reliability": random.uniform(*FALLBACK_DEVICE_RELIABILITY_RANGE_AUTO), # Fallback for old key
-        "predicted_is_noisy_probability": random.uniform(*FALLBACK_PREDICTED_NOISE_PROB_RANGE_AUTO)  # Fallback for old key
+        "predicted_initial_trust": FALLBACK_ML_INITIAL_TRUST_SCORE,
+        # Both random fallbacks are drawn on every call, even when a model replaces them, so a seeded run consumes the same random stream
+        "predicted_inherent_reliability": random.uniform(*FALLBACK_DEVICE_RELIABILITY_RANGE_AUTO),
+        "predicted_is_noisy_probability": random.uniform(*FALLBACK_PREDICTED_NOISE_PROB_RANGE_AUTO)
     }
-    
-    # --- Predict Initial Trust using InitialTrustPredictor ---
-    initial_trust_model = None
-    initial_trust_preprocessor = None
+    if pred_trust is not None: predictions["predicted_initial_trust"] = pred_trust
+    if pred_rel is not None: predictions["predicted_inherent_reliability"] = pred_rel
+    if pred_noi_proba is not None: predictions["predicted_is_noisy_probability"] = pred_noi_proba
+    return predictions
 
-    if os.path.exists(INITIAL_TRUST_MODEL_PATH) and os.path.exists(INITIAL_TRUST_PREPROCESSOR_PATH):
-        try:
-            initial_trust_model = joblib.load(INITIAL_TRUST_MODEL_PATH)
-            initial_trust_preprocessor = joblib.load(INITIAL_TRUST_PREPROCESSOR_PATH)
-        except Exception as e:
-            print(f"Error loading InitialTrustPredictor model/preprocessor: {e}. Using fallback for initial trust.")
-    else:
-        print(f"Warning: InitialTrustPredictor model ('{INITIAL_TRUST_MODEL_PATH}') or preprocessor ('{INITIAL_TRUST_PREPROCESSOR_PATH}') not found. Using fallback for initial trust.")
+
+@functools.lru_cache(maxsize=4096) # Few distinct (manufacturer, version, signed, ages) combinations per simulation
+def predict_from_models(manufacturer, software_version, is_signed, software_age_years, device_age_years):
+    """Model-only predictions for one static feature set: (initial_trust, inherent_reliability, noisy_probability), None where a model is unavailable."""
+    pred_trust, pred_rel, pred_noi_proba = predict_rows([(manufacturer, software_version, is_signed, software_age_years, device_age_years)])
+    return pred_trust[0], pred_rel[0], pred_noi_proba[0]
+
+
+def predict_rows(feature_rows):
+    """Model-only predictions for N feature tuples: (initial_trust list, inherent_reliability list, noisy_probability list), None entries where a model is unavailable."""
+    n_rows = len(feature_rows)
+    pred_trust = pred_rel = pred_noi_proba = [None] * n_rows
+    
+    models = get_models()
+    initial_trust_model = models["initial_trust_model"]
+    initial_trust_preprocessor = models["initial_trust_preprocessor"]
+    if initial_trust_model is None or initial_trust_preprocessor is None:
+        print(f"Warning: InitialTrustPredictor model ('{INITIAL_TRUST_MODEL_PATH}') or preprocessor ('{INITIAL_TRUST_PREPROCESSOR_PATH}') not available. Using fallback for initial trust.")
 
     if initial_trust_model and initial_trust_preprocessor:
         try:
-            input_df = pd.DataFrame([static_features_dict], columns=STATIC_FEATURES)
-            # Ensure categorical features are strings for preprocessor consistency
-            input_df_copy = input_df.copy()
-            for cat_col in CATEGORICAL_FEATURES:
-                if cat_col in input_df_copy.columns:
-                    input_df_copy.loc[:, cat_col] = input_df_copy[cat_col].astype(str)
-            
-            processed_features = initial_trust_preprocessor.transform(input_df_copy)
-            pred_initial_trust = initial_trust_model.predict(processed_features)[0]
-            predictions["predicted_initial_trust"] = round(max(0, min(100, pred_initial_trust)), 1) # Ensure 0-100
+            processed_features = encode_static_features(INITIAL_TRUST_PREPROCESSOR_PATH, initial_trust_preprocessor, feature_rows)
+            pred_trust = np.clip(forest_predict(INITIAL_TRUST_MODEL_PATH, initial_trust_model, processed_features), 0, 100).round(1).tolist() # Ensure 0-100
         except Exception as e:
             print(f"Error during InitialTrustPredictor prediction: {e}. Using fallback for initial trust.")
-            # predictions["predicted_initial_trust"] remains fallback
+            # pred_trust stays None -> fallback
 
-    # --- Optionally, load and predict with old GT-based models if needed for other features ---
-    # This part is kept if 'predicted_inherent_reliability' or 'predicted_is_noisy_probability'
-    # are still used as inputs to the fuzzy logic system or for other comparisons.
-    # If they are NOT used anymore, this block can be removed.
-    gt_preprocessor = None
-    if os.path.exists(GT_PREPROCESSOR_PATH):
-        try: gt_preprocessor = joblib.load(GT_PREPROCESSOR_PATH)
-        except Exception as e: print(f"Error loading GT preprocessor: {e}")
+    # --- GT-based models: 'predicted_inherent_reliability' / 'predicted_is_noisy_probability' ---
+    # Still needed: automation.py stores them as ml_predicted_reliability / ml_predicted_noise_propensity,
+    # which traffic_light_controller.py feeds into its fuzzy trust evaluation.
+    gt_preprocessor = models["gt_preprocessor"]
 
     if gt_preprocessor: # Only proceed if GT preprocessor loaded
         try:
-            input_df_gt = pd.DataFrame([static_features_dict], columns=STATIC_FEATURES)
-            input_df_gt_copy = input_df_gt.copy()
-            for cat_col in CATEGORICAL_FEATURES:
-                if cat_col in input_df_gt_copy.columns:
-                    input_df_gt_copy.loc[:, cat_col] = input_df_gt_copy[cat_col].astype(str)
-            processed_features_gt = gt_preprocessor.transform(input_df_gt_copy)
-
-            if os.path.exists(GT_RELIABILITY_MODEL_PATH):
+            processed_features_gt = encode_static_features(GT_PREPROCESSOR_PATH, gt_preprocessor, feature_rows)
+
+            gt_reliability_model = models["gt_reliability_model"]
+            if gt_reliability_model is not None:
                 try:
-                    gt_reliability_model = joblib.load(GT_RELIABILITY_MODEL_PATH)
-                    pred_rel = gt_reliability_model.predict(processed_features_gt)[0]
-                    predictions["predicted_inherent_reliability"] = round(max(0, min(100, pred_rel)), 1)
+                    pred_rel = np.clip(forest_predict(GT_RELIABILITY_MODEL_PATH, gt_reliability_model, processed_features_gt), 0, 100).round(1).tolist()
                 except Exception as e: print(f"Error during GT reliability prediction: {e}")
             
-            if os.path.exists(GT_NOISY_CONFIG_MODEL_PATH):
+            gt_noisy_model = models["gt_noisy_model"]
+            if gt_noisy_model is not None:
                 try:
-                    gt_noisy_model = joblib.load(GT_NOISY_CONFIG_MODEL_PATH)
-                    pred_noi_proba = gt_noisy_model.predict_proba(processed_features_gt)[0][1]
-                    predictions["predicted_is_noisy_probability"] = round(pred_noi_proba, 3)
+                    class_proba = forest_predict(GT_NOISY_CONFIG_MODEL_PATH, gt_noisy_model, processed_features_gt)
+                    noisy_classes = list(gt_noisy_model.classes_) # A single-class (constant) model has no column for the class it never saw
+                    pred_noi_proba = class_proba[:, noisy_classes.index(1)].round(3).tolist() if 1 in noisy_classes else [0.0] * n_rows
                 except Exception as e: print(f"Error during GT noisy config probability prediction: {e}")
         except Exception as e:
             print(f"Error during GT model predictions (after loading GT preprocessor): {e}")
             
-    return predictions
-
+    return pred_trust, pred_rel, pred_noi_proba
 
 if __name__ == '__main__':
     print("ML Risk Assessor Module")
@@ -0,0 +1,48 @@
+# Shared CSR routing for the simulate_traffic loops in firstgraphautomation.py and simulatedtrafficautomation.py
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+
+def build_route_graph(G, travel_time, travel_times=None):
+    """
+    Packs G for scipy's compiled Dijkstra: a CSR matrix with one stored entry per edge direction, weighted by
+    travel_time(speed_limit, traffic, capacity), plus the per-edge state needed to re-weight single edges as traffic is added.
+    travel_times, if given, computes the initial weights for all edges at once from per-edge lists.
+    """
+    nodes = list(G.nodes()); node_pos = {node: i for i, node in enumerate(nodes)}
+    edge_list = list(G.edges()); both_ways = not G.is_directed()
+    rows, cols, entry_edge, edge_id = [], [], [], {}
+    for k, (u, v) in enumerate(edge_list):
+        for a, b in ((u, v), (v, u)) if both_ways and u != v else ((u, v),):
+            rows.append(node_pos[a]); cols.append(node_pos[b]); entry_edge.append(k); edge_id[(node_pos[a], node_pos[b])] = k
+    # Build with entry numbers as data to learn which CSR slot each entry landed in (CSR sorts entries by row/column)
+    csr = csr_matrix((np.arange(1, len(rows) + 1, dtype=np.float64), (rows, cols)), shape=(len(nodes), len(nodes)))
+    entry_at_slot = csr.data.astype(np.intp) - 1
+    edge_slots = [[] for _ in edge_list]
+    for slot, entry in enumerate(entry_at_slot.tolist()): edge_slots[entry_edge[entry]].append(slot)
+    speed = [G[u][v].get('speed_limit', 60) for u, v in edge_list]; capacity = [G[u][v].get('capacity', 50) for u, v in edge_list]
+    traffic = [G[u][v].get('current_traffic', 0) for u, v in edge_list]
+    if travel_times is not None: weights = np.asarray(travel_times(speed, traffic, capacity), dtype=np.float64)
+    else: weights = np.array([travel_time(speed[k], traffic[k], capacity[k]) for k in range(len(edge_list))], dtype=np.float64)
+    csr.data = weights[np.array(entry_edge, dtype=np.intp)[entry_at_slot]]
+    return {"nodes": nodes, "node_pos": node_pos, "edge_list": edge_list, "edge_id": edge_id, "edge_slots": edge_slots,
+            "speed": speed, "capacity": capacity, "traffic": traffic, "csr": csr, "travel_time": travel_time}
+
+def find_fastest_route_csgraph(route_graph, source, destination):
+    """ find_fastest_route on a build_route_graph() graph: scipy's C Dijkstra from source, then backtrack the predecessors. """
+    node_pos = route_graph["node_pos"]; source_pos, dest_pos = node_pos[source], node_pos[destination]
+    _, predecessors = dijkstra(route_graph["csr"], directed=True, indices=source_pos, return_predecessors=True)
+    if dest_pos != source_pos and predecessors[dest_pos] < 0: return None # Unreachable
+    path_pos = [dest_pos]
+    while path_pos[-1] != source_pos: path_pos.append(int(predecessors[path_pos[-1]]))
+    nodes = route_graph["nodes"]
+    return [nodes[i] for i in reversed(path_pos)]
+
+def add_route_traffic(route_graph, path):
+    """ One more car on every edge of path, re-weighting just those edges in the CSR matrix. """
+    node_pos, edge_id, traffic, travel_time = route_graph["node_pos"], route_graph["edge_id"], route_graph["traffic"], route_graph["travel_time"]
+    speed, capacity, edge_slots, csr_data = route_graph["speed"], route_graph["capacity"], route_graph["edge_slots"], route_graph["csr"].data
+    for u, v in zip(path, path[1:]):
+        k = edge_id[(node_pos[u], node_pos[v])]; traffic[k] += 1
+        csr_data[edge_slots[k]] = travel_time(speed[k], traffic[k], capacity[k])
@@ -3,6 +3,12 @@ import networkx as nx
 import random
 import os
 import math # For ceiling division
+import numpy as np
+try:
+    from csgraph_routing import build_route_graph, find_fastest_route_csgraph, add_route_traffic
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
 
 # --------------------------------------------------------------------------
 # Functions from RealTrafficSim.py (Graph Generation & Simulation)
@@ -26,20 +32,23 @@ def generate_graph(num_nodes, density_factor, seed):
     speed_limit_range = (30, 50) if density_factor > 0.5 else (70, 120)
 
     # Generate the base graph using Erdos-Renyi model
+    # fast_gnp_random_graph is O(n + m) and wins on sparse graphs; for p >= 0.2 the O(n^2) generator measured as fast or faster
+    gnp_generator = nx.fast_gnp_random_graph if edge_probability < 0.2 else nx.gnp_random_graph
     # We retry a few times if the graph is initially empty or too sparse
     for _ in range(5): # Try up to 5 times
-        G = nx.erdos_renyi_graph(n=num_nodes, p=edge_probability, seed=random.randint(1, 10000)) # Use different seed each try
+        G = gnp_generator(n=num_nodes, p=edge_probability, seed=random.randint(1, 10000)) # Use different seed each try
         if G.number_of_edges() > 0:
             break
     else:
         print(f"[Warning] Could not generate a graph with edges after multiple attempts. Using last attempt.")
 
 
-    # Assign speed limits, capacity, and initial traffic to edges
-    for (u, v) in G.edges():
-        G[u][v]['speed_limit'] = random.randint(*speed_limit_range)
-        G[u][v]['capacity'] = random.randint(20, 100) # Capacity of the road segment
-        G[u][v]['current_traffic'] = 0 # Initial traffic is zero
+    # Assign speed limits, capacity, and initial traffic to edges (attributes drawn in one batch from a seeded generator)
+    rng = np.random.default_rng(seed)
+    speed_limits = rng.integers(speed_limit_range[0], speed_limit_range[1] + 1, size=G.number_of_edges()).tolist()
+    capacities = rng.integers(20, 101, size=G.number_of_edges()).tolist() # Capacity of the road segment, 20-100
+    for (u, v), speed_limit, capacity in zip(G.edges(), speed_limits, capacities):
+        G[u][v].update(speed_limit=speed_limit, capacity=capacity, current_traffic=0) # Initial traffic is zero
 
     return G
 
@@ -100,8 +109,9 @@ def simulate_traffic(G, num_cars, num_iterations, seed):
 
     print(f"Simulating {num_cars} cars for {num_iterations} iterations...")
     # Reset traffic before simulation
-    for u, v in G.edges():
-        G[u][v]['current_traffic'] = 0
+    nx.set_edge_attributes(G, 0, 'current_traffic')
+    # With scipy, routing runs on a CSR copy of the graph and counts are written back to G after each iteration
+    route_graph = build_route_graph(G, calculate_travel_time) if SCIPY_AVAILABLE else None
 
     for iteration in range(num_iterations):
         cars_this_iteration = 0
@@ -117,20 +127,21 @@ def simulate_traffic(G, num_cars, num_iterations, seed):
             if len(nodes) <= 1: continue # Skip if only one node
 
             # Find the fastest route based on current congestion
-            path = find_fastest_route(G, source, destination)
+            path = find_fastest_route(G, source, destination) if route_graph is None else find_fastest_route_csgraph(route_graph, source, destination)
 
             # If a path exists, increment traffic count along the path edges
             if path and len(path) > 1:
                 cars_this_iteration += 1
-                for i in range(len(path) - 1):
-                    u, v = path[i], path[i + 1]
-                    # Increment traffic count for the edge (handle both directions if needed)
-                    if G.has_edge(u, v):
-                         # Basic increment, could be more complex (e.g., time-based)
-                        G[u][v]['current_traffic'] += 1
-                    # If graph is undirected, the above check is sufficient.
+                if route_graph is not None: add_route_traffic(route_graph, path); continue
+                adjacency = G.adj
+                for u, v in zip(path, path[1:]):
+                    # Path edges come from G itself, so no has_edge check; adjacency[u][v] is the same dict as G[u][v]
+                    # Basic increment, could be more complex (e.g., time-based)
+                    adjacency[u][v]['current_traffic'] += 1
                     # If directed, you might need G[v][u]['current_traffic'] += 1 depending on model.
 
+        if route_graph is not None:
+            for (u, v), edge_traffic in zip(route_graph["edge_list"], route_graph["traffic"]): G[u][v]['current_traffic'] = edge_traffic
         print(f"  Iteration {iteration + 1}: {cars_this_iteration} cars routed.")
         # Optional: Decay traffic slightly each iteration?
         # for u,v in G.edges(): G[u][v]['current_traffic'] *= 0.95
@@ -176,6 +187,7 @@ def generate_lab_config_with_routers(num_clusters, min_machines, max_machines, c
         config_lines.append(f"{router_name}[privileged]=true    $") # Assumed needed by router image
         config_lines.append(f"{router_name}[0]={cluster_lan_name}    $ip({router_ip_on_lan}/24);")
         config_lines.append(f"{router_name}[1]={backbone_lan_name}    $ip({router_ip_on_backbone}/24);")
+        router_details[cluster_id]["eth1_line_idx"] = len(config_lines) - 1 # Second pass appends RIP config to this line
 
         # Define Client Machines (Sensors) in this Cluster
         print(f"  Defining {num_machines_in_cluster} client machine(s) for cluster {cluster_id} on {cluster_lan_name}")
@@ -200,20 +212,17 @@ def generate_lab_config_with_routers(num_clusters, min_machines, max_machines, c
         print(f"  Configuring RIP for {router_name}...")
 
         router_eth1_line_start = f"{router_name}[1]={backbone_lan_name}"
-        found_line_to_append = False
-        for i in range(len(config_lines) - 1, -1, -1):
-            line_parts = config_lines[i].split('$', 1)
-            definition_part = line_parts[0].strip()
-            if definition_part.startswith(router_eth1_line_start):
-                existing_commands = line_parts[1].strip() if len(line_parts) > 1 else ""
-                if existing_commands and not existing_commands.endswith(';'):
-                    existing_commands += ";"
-                separator = " " if existing_commands else ""
-                config_lines[i] = f"{definition_part}    ${existing_commands}{separator}{rip_command}"
-                # print(f"    Appended RIP config to line {i+1}") # Less verbose
-                found_line_to_append = True
-                break
-        if not found_line_to_append:
+        i = router_details[cluster_id].get("eth1_line_idx") # Recorded in the first pass, so no scan over config_lines
+        line_parts = config_lines[i].split('$', 1) if i is not None else [""]
+        definition_part = line_parts[0].strip()
+        if definition_part.startswith(router_eth1_line_start):
+            existing_commands = line_parts[1].strip() if len(line_parts) > 1 else ""
+            if existing_commands and not existing_commands.endswith(';'):
+                existing_commands += ";"
+            separator = " " if existing_commands else ""
+            config_lines[i] = f"{definition_part}    ${existing_commands}{separator}{rip_command}"
+            # print(f"    Appended RIP config to line {i+1}") # Less verbose
+        else:
             print(f"  Warning: Could not find config line for '{router_eth1_line_start}' to append RIP config.")
 
     print("--- Kathara Configuration Generation Complete ---")
@@ -5,6 +5,12 @@ import os
 import math # For ceiling division
 import json # To save traffic data
 import shutil # To remove directory tree
+try: # Optional: compiled Dijkstra for simulate_traffic
+    import numpy as np
+    from csgraph_routing import build_route_graph, find_fastest_route_csgraph, add_route_traffic
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
 
 # --------------------------------------------------------------------------
 # Functions for Graph Generation & Simulation
@@ -36,11 +42,20 @@ def calculate_travel_time(speed_limit, traffic, capacity):
     if effective_speed <= 0: return float('inf') # Avoid division by zero if effective speed becomes 0
     return 1 / (effective_speed / 60) # Time = Dist(1)/Speed(km/min)
 
-def find_fastest_route(G, source, destination):
-    """Find fastest route using Dijkstra."""
+def travel_times(speed_limit, traffic, capacity):
+    """calculate_travel_time over whole per-edge arrays in one NumPy pass (congested edges can differ in the last bit: NumPy's pow vs Python's)."""
+    speed_limit, traffic, capacity = (np.asarray(a, dtype=np.float64) for a in (speed_limit, traffic, capacity))
+    with np.errstate(divide='ignore', invalid='ignore'): # capacity <= 0 / speed <= 0 are masked to inf below
+        congestion_factor = np.minimum(1.0, traffic / capacity)
+        effective_speed = np.where(congestion_factor <= 0.1, speed_limit, np.maximum(1, speed_limit / np.power(2.0, congestion_factor * 3)))
+        times = 1 / (effective_speed / 60)
+    return np.where((capacity <= 0) | (effective_speed <= 0), np.inf, times)
+
+def find_fastest_route(G, source, destination, weight=None):
+    """Find fastest route using Dijkstra. weight: name of an edge attribute already holding the travel time (else computed per relaxation)."""
     try:
         def weight_function(u, v, data): return calculate_travel_time(data.get('speed_limit', 60), data.get('current_traffic', 0), data.get('capacity', 50))
-        return nx.shortest_path(G, source, destination, weight=weight_function)
+        return nx.shortest_path(G, source, destination, weight=weight_function if weight is None else weight)
     except nx.NetworkXNoPath: return None # Handle case where no path exists cleanly
     except Exception as e: print(f"[Error] Pathfinding failed between {source} and {destination}: {e}"); return None
 
@@ -53,22 +68,31 @@ def simulate_traffic(G, num_cars, num_iterations, seed):
     print(f"Simulating {num_cars} cars for {num_iterations} iterations...")
     # Ensure traffic is reset before simulation
     for u, v in G.edges(): G[u][v]['current_traffic'] = 0
+    # With scipy, cars are routed one at a time on a CSR copy of G (each still sees the traffic of the cars before it); counts live in its per-edge list
+    route_graph = build_route_graph(G, calculate_travel_time, travel_times) if SCIPY_AVAILABLE else None
+    if route_graph is None: # networkx fallback: keep each edge's travel time on the edge, updated as traffic is added
+        for u, v, data in G.edges(data=True): data['travel_time'] = calculate_travel_time(data.get('speed_limit', 60), 0, data.get('capacity', 50))
     for iteration in range(num_iterations):
         cars_this_iteration = 0
         for _ in range(num_cars):
             source = random.choice(nodes); destination = random.choice(nodes)
             while destination == source: destination = random.choice(nodes) # Ensure different source/dest
 
-            path = find_fastest_route(G, source, destination)
+            path = find_fastest_route(G, source, destination, weight='travel_time') if route_graph is None else find_fastest_route_csgraph(route_graph, source, destination)
             if path and len(path) > 1:
                 cars_this_iteration += 1
+                if route_graph is not None: add_route_traffic(route_graph, path); continue
                 for i in range(len(path) - 1):
                     u, v = path[i], path[i + 1]
-                    if G.has_edge(u, v): G[u][v]['current_traffic'] += 1
+                    if G.has_edge(u, v):
+                        data = G[u][v]; data['current_traffic'] += 1
+                        data['travel_time'] = calculate_travel_time(data.get('speed_limit', 60), data['current_traffic'], data.get('capacity', 50))
                     # If graph was directed, might need G[v][u] logic too
         # Print progress periodically
         if (iteration + 1) % 5 == 0 or iteration == 0 or (iteration + 1) == num_iterations:
              print(f"  Iteration {iteration + 1}: {cars_this_iteration} cars routed.")
+    if route_graph is not None: # Counts back onto the graph once, after the whole run
+        for (u, v), edge_traffic in zip(route_graph["edge_list"], route_graph["traffic"]): G[u][v]['current_traffic'] = edge_traffic
     return G
 # --------------------------------------------------------------------------
 
@@ -108,6 +132,7 @@ def generate_lab_config_with_routers(num_clusters, min_machines, max_machines, c
         config_lines.append(f"{router_name}[privileged]=true    $") # Assumed needed
         config_lines.append(f"{router_name}[0]={cluster_lan_name}    $ip({router_ip_on_lan}/24);")
         config_lines.append(f"{router_name}[1]={backbone_lan_name}    $ip({router_ip_on_backbone}/24);")
+        router_details[cluster_id]["eth1_line_idx"] = len(config_lines) - 1 # RIP pass appends to this line directly
 
         # Define Client Machines (Sensors)
         edge_info = cluster_edge_map.get(cluster_id, {}).get('edge', 'unknown')
@@ -152,18 +177,15 @@ def generate_lab_config_with_routers(num_clusters, min_machines, max_machines, c
         rip_command = f"rip({router_name}, {lan_subnet}, connected); rip({router_name}, {backbone_subnet}, connected);"
         # print(f"  Configuring RIP for {router_name}...") # Less verbose
         router_eth1_line_start = f"{router_name}[1]={backbone_lan_name}"
-        found_line_to_append = False
-        for i in range(len(config_lines) - 1, -1, -1):
-            line_parts = config_lines[i].split('$', 1)
-            definition_part = line_parts[0].strip()
-            if definition_part.startswith(router_eth1_line_start):
-                existing_commands = line_parts[1].strip() if len(line_parts) > 1 else ""
-                if existing_commands and not existing_commands.endswith(';'): existing_commands += ";"
-                separator = " " if existing_commands else ""
-                config_lines[i] = f"{definition_part}    ${existing_commands}{separator}{rip_command}"
-                found_line_to_append = True
-                break
-        if not found_line_to_append: print(f"  Warning: Could not find config line for '{router_eth1_line_start}' to append RIP config.")
+        i = router_details[cluster_id].get("eth1_line_idx") # Recorded when the line was added: no scan over config_lines
+        line_parts = config_lines[i].split('$', 1) if i is not None else [""]
+        definition_part = line_parts[0].strip()
+        if definition_part.startswith(router_eth1_line_start):
+            existing_commands = line_parts[1].strip() if len(line_parts) > 1 else ""
+            if existing_commands and not existing_commands.endswith(';'): existing_commands += ";"
+            separator = " " if existing_commands else ""
+            config_lines[i] = f"{definition_part}    ${existing_commands}{separator}{rip_command}"
+        else: print(f"  Warning: Could not find config line for '{router_eth1_line_start}' to append RIP config.")
 
 
     print("--- Kathara Configuration Generation Complete ---")
@@ -197,13 +219,16 @@ if __name__ == "__main__":
     print("+++ Starting Graph Simulation +++")
     G = generate_graph(graph_num_nodes, graph_density_factor, graph_seed)
     if G is None: exit("[ERROR] Graph generation failed.") # Check if generate_graph returned None
-    if not nx.is_connected(G):
+    largest_cc_nodes = set() # One BFS pass serves as both the connectivity check and the largest-component search
+    for component in nx.connected_components(G):
+        if len(component) > len(largest_cc_nodes): largest_cc_nodes = component
+        if 2 * len(largest_cc_nodes) > G.number_of_nodes(): break # Holds over half the nodes: nothing else can be larger
+    if len(largest_cc_nodes) < G.number_of_nodes():
         print("Graph not connected. Using largest component.")
-        largest_cc_nodes = max(nx.connected_components(G), key=len)
         G = G.subgraph(largest_cc_nodes).copy()
         print(f"Using component with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
     if G.number_of_edges() == 0 or G.number_of_nodes() <= 1: exit("[ERROR] Graph component too small or empty.")
-    G_simulated = simulate_traffic(G.copy(), sim_num_cars, sim_num_iterations, graph_seed)
+    G_simulated = simulate_traffic(G, sim_num_cars, sim_num_iterations, graph_seed) # Simulates in place: G is not used again, so no copy
     print("Traffic simulation complete.")
     all_edges = list(G_simulated.edges(data=True)); num_edges = len(all_edges)
     num_clusters_target = max(2, math.ceil(num_edges / CLUSTER_EDGE_RATIO)); num_clusters = min(num_clusters_target, num_edges)
@@ -235,10 +260,7 @@ if __name__ == "__main__":
     # --- Write lab.confu ---
     try:
         with open(confu_file, "w") as f:
-            # Write line by line ensuring newline
-            lines = lab_config_str.splitlines()
-            for line in lines:
-                 f.write(line.rstrip() + "\n") # Add newline after each line
+            f.write("".join(line.rstrip() + "\n" for line in lab_config_str.splitlines())) # One write; each line stripped and newline-terminated
         print(f"Successfully generated {confu_file}")
     except IOError as e: print(f"Error writing {confu_file}: {e}"); exit(1)
 
@@ -366,6 +366,28 @@ def get_traffic_for_sensor_api(cluster_id):
     return jsonify(response_data)
 
 
+def compute_approaching_traffic(local_G, local_edge_occupancy, local_groups, node_id):
+    approaching_traffic = {}
+    for neighbor in local_G.neighbors(node_id):
+        edge_key_tuple = tuple(sorted((node_id, neighbor)))
+        count = 0
+        # NEW: Check for priority on approach
+        has_priority_on_approach = False
+        group_ids_on_edge = local_edge_occupancy.get(edge_key_tuple, set())
+        for group_id in list(group_ids_on_edge):
+             group = local_groups.get(group_id)
+             if group and group.get("current_node") == neighbor: # Approaching node_id from neighbor
+                 count += group.get("size", 0)
+                 if group.get("is_priority", False):
+                     has_priority_on_approach = True # No break, count all cars
+        
+        # Edge name indicates direction TOWARDS node_id
+        approaching_traffic[f"{neighbor}-{node_id}"] = {
+            "traffic": count,
+            "priority_detected": has_priority_on_approach # NEW
+        }
+    return approaching_traffic
+
 @app.route('/approaching_traffic/<int:node_id>', methods=['GET'])
 def get_approaching_traffic_api(node_id):
     # api_call_received_time = time.time()
@@ -386,25 +408,7 @@ def get_approaching_traffic_api(node_id):
         # log_msg(f"API /approaching_traffic/{node_id}: Aborting 404, node not in graph.")
         abort(404, description=f"Node {node_id} not found in graph.")
     
-    approaching_traffic = {}
-    for neighbor in local_G.neighbors(node_id):
-        edge_key_tuple = tuple(sorted((node_id, neighbor)))
-        count = 0
-        # NEW: Check for priority on approach
-        has_priority_on_approach = False
-        group_ids_on_edge = local_edge_occupancy.get(edge_key_tuple, set())
-        for group_id in list(group_ids_on_edge):
-             group = local_groups.get(group_id)
-             if group and group.get("current_node") == neighbor: # Approaching node_id from neighbor
-                 count += group.get("size", 0)
-                 if group.get("is_priority", False):
-                     has_priority_on_approach = True # No break, count all cars
-        
-        # Edge name indicates direction TOWARDS node_id
-        approaching_traffic[f"{neighbor}-{node_id}"] = {
-            "traffic": count,
-            "priority_detected": has_priority_on_approach # NEW
-        }
+    approaching_traffic = compute_approaching_traffic(local_G, local_edge_occupancy, local_groups, node_id)
     
     response_data = { "node_id": node_id, "traffic_per_approach": approaching_traffic }
     # log_msg(f"API /approaching_traffic/{node_id}: Responding. Total time: {time.time() - api_call_received_time:.4f}s")
@@ -435,6 +439,27 @@ def get_passed_through_node_count_api(node_id):
     # log_msg(f"API /passed_through_node_count/{node_id}: Responding. Total time: {time.time() - api_call_received_time:.4f}s")
     return jsonify(response_data)
 
+@app.route('/node_snapshot/<int:node_id>', methods=['GET'])
+def get_node_snapshot_api(node_id):
+    # Approaching traffic and passed-through count from one published state, so traffic lights need a single request per cycle
+    with state_publish_lock:
+        if not published_state["graph_loaded_successfully"]:
+            abort(503, description="Graph not loaded by server.")
+        local_G = published_state["G"]
+        local_edge_occupancy = published_state["edge_occupancy"]
+        local_groups = published_state["groups"]
+        local_passed_through_log = published_state["passed_through_node_log_current_step"]
+
+    if node_id not in local_G.nodes():
+        abort(404, description=f"Node {node_id} not found in graph.")
+
+    response_data = {
+        "node_id": node_id,
+        "traffic_per_approach": compute_approaching_traffic(local_G, local_edge_occupancy, local_groups, node_id),
+        "cars_passed_through_last_step": local_passed_through_log.get(node_id, 0)
+    }
+    return jsonify(response_data)
+
 @app.route('/status', methods=['GET'])
 def status_api():
     # api_call_received_time = time.time()
@@ -24,7 +24,8 @@ def main(args):
     # Call the centralized training function in ml_risk_assessor
     success = ml_risk_assessor.train_models(
         data_filepath=args.data_file,
-        model_type=args.model_type
+        model_type=args.model_type,
+        warm_start=args.warm_start
     )
 
     if success:
@@ -54,6 +55,11 @@ if __name__ == "__main__":
         choices=["InitialTrustPredictor", "GTReliability", "GTNoisy"], # Add other types if any
         help="Type of model to train."
     )
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="InitialTrustPredictor only: extend the saved forest (if still below its right-sized tree count) instead of refitting it from scratch."
+    )
     
     parsed_args = parser.parse_args()
     main(parsed_args)